@@ -4,10 +4,10 @@ import algorithm.models as algorithm_models
 
 algorithm = [algorithm_models.Progress,
              algorithm_models.UserAnswer,
-             algorithm_models.WeakestLinkTopic,
-             algorithm_models.WeakestLinkProblem,
              algorithm_models.UserWeakestLinkState,
+             algorithm_models.UserProgressVersion,
              algorithm_models.TopicGraphEdge,
+             algorithm_models.TopicGraphLearningState,
              algorithm_models.UserTargetPoints]
 
 admin.site.register(algorithm)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AlgorithmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'algorithm'
+
+    def ready(self):
+        import algorithm.signals
@@ -0,0 +1,32 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.db import connections, transaction
+
+from config.settings import Constants
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=Constants.BACKGROUND_WORKERS,
+                              thread_name_prefix='algorithm')
+
+
+def run_in_background(function: Callable, *args, **kwargs):
+    """Выполняет функцию в пуле фоновых потоков. После выполнения
+    соединения потока с БД закрываются.
+    """
+    def task():
+        try:
+            function(*args, **kwargs)
+        except Exception as e:
+            logger.error(f'( ! ) [ошибка фоновой задачи {function.__name__}] {e}')
+        finally:
+            connections.close_all()
+
+    executor.submit(task)
+
+
+def run_in_background_on_commit(function: Callable, *args, **kwargs):
+    """Выполняет функцию в пуле фоновых потоков после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: run_in_background(function, *args, **kwargs))
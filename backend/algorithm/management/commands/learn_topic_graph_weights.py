@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from algorithm.problem_selector.topic_graph_learning import learn_topic_graph_weights
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = ('Обновляет веса графа связи тем по ответам пользователей,'
+            ' созданным после предыдущего расчета.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*',
+                            help='id курсов (по умолчанию все курсы)')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('title')
+        if options['course_ids']:
+            courses = courses.filter(pk__in=options['course_ids'])
+        for course in courses:
+            number_of_answers = learn_topic_graph_weights(course.id)
+            self.stdout.write(f'{course.title}: учтено ответов {number_of_answers}.')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from algorithm.problem_selector.batch_selector import next_practice_problems
+from algorithm.problem_selector.next_problem_queue import store_prefetched_problem
+from algorithm.utils import get_progress_versions
+from courses.models import Semester
+
+
+class Command(BaseCommand):
+    help = ('Подбирает следующее практическое задание всем студентам семестра'
+            ' и помещает его в очередь заранее подобранных заданий.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester_id', help='id семестра')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='количество студентов в одном пакете')
+
+    def handle(self, *args, **options):
+        semester = Semester.objects.filter(pk=options['semester_id']).first()
+        if semester is None:
+            raise CommandError(f'Семестр {options["semester_id"]} не найден.')
+        students = list(semester.students.order_by('id'))
+        batch_size = options['batch_size']
+        number_of_stored_problems = 0
+        for start in range(0, len(students), batch_size):
+            users = students[start:start + batch_size]
+            user_ids = [user.id for user in users]
+            versions = get_progress_versions(user_ids, semester.id)
+            problems = next_practice_problems([(user, semester) for user in users])
+            current_versions = get_progress_versions(user_ids, semester.id)
+            for user, problem in zip(users, problems):
+                if problem is None or current_versions[user.id] != versions[user.id]:
+                    continue
+                store_prefetched_problem(user.id, semester.id, versions[user.id], problem)
+                number_of_stored_problems += 1
+        self.stdout.write(f'Подобрано заданий: {number_of_stored_problems} из {len(students)}.')
@@ -0,0 +1,14 @@
+# Generated by Django 4.1.1 on 2026-10-18 02:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('algorithm', '0011_alter_usertargetpoints_target_points'),
+        ('algorithm', '0012_alter_progress_options_alter_useranswer_options_and_more'),
+    ]
+
+    operations = [
+    ]
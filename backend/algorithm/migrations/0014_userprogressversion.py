@@ -0,0 +1,31 @@
+# Generated by Django 4.1.1 on 2026-10-18 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_alter_course_thumbnail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('algorithm', '0013_merge_20261018_0257'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProgressVersion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.semester')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='userprogressversion',
+            constraint=models.UniqueConstraint(fields=('user', 'semester'), name='unique_user_semester_progress_version'),
+        ),
+    ]
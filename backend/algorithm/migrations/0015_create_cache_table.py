@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Ранее создавала таблицу кэша. Таблица кэша next_problem создается
+    при развертывании командой createcachetable, миграция оставлена пустой,
+    чтобы не нарушать историю миграций.
+    """
+
+    dependencies = [
+        ('algorithm', '0014_userprogressversion'),
+    ]
+
+    operations = []
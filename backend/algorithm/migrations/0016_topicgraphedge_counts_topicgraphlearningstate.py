@@ -0,0 +1,36 @@
+# Generated by Django 4.1.1 on 2026-10-18 03:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_alter_course_thumbnail'),
+        ('algorithm', '0015_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicGraphLearningState',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='courses.course')),
+                ('last_answer_created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='topicgraphedge',
+            name='co_failure_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='topicgraphedge',
+            name='co_success_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='topicgraphedge',
+            constraint=models.UniqueConstraint(fields=('course', 'topic1', 'topic2'), name='unique_course_topic1_topic2'),
+        ),
+    ]
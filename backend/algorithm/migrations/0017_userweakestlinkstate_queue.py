@@ -0,0 +1,70 @@
+# Generated by Django 4.1.1 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+def move_queues_to_states(apps, schema_editor):
+    UserWeakestLinkState = apps.get_model('algorithm', 'UserWeakestLinkState')
+    WeakestLinkProblem = apps.get_model('algorithm', 'WeakestLinkProblem')
+    WeakestLinkTopic = apps.get_model('algorithm', 'WeakestLinkTopic')
+    states = {(state.user_id, state.semester_id): state for state in UserWeakestLinkState.objects.all()}
+    for problem in WeakestLinkProblem.objects.order_by('group_number'):
+        state = states.get((problem.user_id, problem.semester_id))
+        if state is not None:
+            state.problems.append({'problem': str(problem.problem_id), 'group_number': problem.group_number,
+                                   'is_solved': problem.is_solved})
+    for topic in WeakestLinkTopic.objects.order_by('group_number'):
+        state = states.get((topic.user_id, topic.semester_id))
+        if state is not None:
+            state.topics.append({'topic': str(topic.topic_id), 'group_number': topic.group_number})
+    UserWeakestLinkState.objects.bulk_update(states.values(), ['problems', 'topics'])
+
+
+def move_queues_to_tables(apps, schema_editor):
+    UserWeakestLinkState = apps.get_model('algorithm', 'UserWeakestLinkState')
+    WeakestLinkProblem = apps.get_model('algorithm', 'WeakestLinkProblem')
+    WeakestLinkTopic = apps.get_model('algorithm', 'WeakestLinkTopic')
+    problems = []
+    topics = []
+    for state in UserWeakestLinkState.objects.all():
+        problems.extend(WeakestLinkProblem(user_id=state.user_id, semester_id=state.semester_id,
+                                           problem_id=problem['problem'], group_number=problem['group_number'],
+                                           is_solved=problem['is_solved'])
+                        for problem in state.problems)
+        topics.extend(WeakestLinkTopic(user_id=state.user_id, semester_id=state.semester_id,
+                                       topic_id=topic['topic'], group_number=topic['group_number'])
+                      for topic in state.topics)
+    WeakestLinkProblem.objects.bulk_create(problems)
+    WeakestLinkTopic.objects.bulk_create(topics)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('algorithm', '0016_topicgraphedge_counts_topicgraphlearningstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userweakestlinkstate',
+            name='problems',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='userweakestlinkstate',
+            name='topics',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='userweakestlinkstate',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(move_queues_to_states, move_queues_to_tables),
+        migrations.DeleteModel(
+            name='WeakestLinkProblem',
+        ),
+        migrations.DeleteModel(
+            name='WeakestLinkTopic',
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+THEORY_TYPES = ['Multiple Choice Radio', 'Multiple Choice Checkbox', 'Fill In Single Blank']
+
+
+def calculate_placement(apps, schema_editor):
+    Progress = apps.get_model('algorithm', 'Progress')
+    UserAnswer = apps.get_model('algorithm', 'UserAnswer')
+    placements = {}
+    user_answers = UserAnswer.objects.filter(
+        problem__type__in=THEORY_TYPES,
+        is_solved__isnull=False
+    ).order_by('created_at').values_list('user_id', 'semester_id', 'problem__main_topic_id',
+                                         'is_solved', 'coefficient')
+    for user_id, semester_id, topic_id, is_solved, coefficient in user_answers.iterator():
+        key = (user_id, semester_id, topic_id)
+        answers_count, streak, longest_streak = placements.get(key, (0, 0.0, 0.0))
+        streak = streak + coefficient if is_solved else 0.0
+        placements[key] = (answers_count + 1, streak, max(longest_streak, streak))
+    progresses = []
+    for progress in Progress.objects.all().iterator():
+        placement = placements.get((progress.user_id, progress.semester_id, progress.topic_id))
+        if placement is not None:
+            (progress.placement_answers_count, progress.placement_streak,
+             progress.placement_longest_streak) = placement
+            progresses.append(progress)
+    Progress.objects.bulk_update(progresses, ['placement_answers_count', 'placement_streak',
+                                              'placement_longest_streak'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('algorithm', '0017_userweakestlinkstate_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progress',
+            name='placement_answers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='progress',
+            name='placement_longest_streak',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='progress',
+            name='placement_streak',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(calculate_placement, migrations.RunPython.noop),
+    ]
@@ -42,6 +42,9 @@ class Progress(AbstractUserSemester):
     theory_points = models.FloatField(default=0.0)
     practice_points = models.FloatField(default=0.0)
     skill_level = models.FloatField(default=1.7)
+    placement_answers_count = models.PositiveIntegerField(default=0)
+    placement_streak = models.FloatField(default=0.0)
+    placement_longest_streak = models.FloatField(default=0.0)
 
     class Meta:
         constraints = [
@@ -89,37 +92,10 @@ class UserAnswer(AbstractUserSemester):
         ordering = ['-created_at']
 
 
-class WeakestLinkTopic(AbstractUserSemester):
-    """Темы проблемных заданий с указанием группы."""
-    topic = models.ForeignKey(Topic, on_delete=models.CASCADE)
-    group_number = models.IntegerField()
-
-    def __str__(self):
-        return (f'semester={self.semester}, topic={self.topic},'
-                f' group_number={self.group_number}, user={self.user}')
-
-    class Meta:
-        ordering = ['user__username', 'group_number']
-
-
-class WeakestLinkProblem(AbstractUserSemester):
-    """Задание из очереди слабого звена."""
-    problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
-    group_number = models.IntegerField()
-    is_solved = models.BooleanField(default=None, blank=True, null=True)
-
-    def __str__(self):
-        return (f'semester={self.semester}, problem={self.problem},'
-                f' group_number={self.group_number}, user={self.user}')
-
-    class Meta:
-        ordering = ['user__username', 'group_number']
-
-
 class WeakestLinkState(models.TextChoices):
     """NONE — алгоритм подбора заданий работает в обычном режиме.
     IN_PROGRESS — алгоритм поиска слабого звена запущен, задания подбираются
-    из очереди (WeakestLinkProblem).
+    из очереди (UserWeakestLinkState.problems).
     DONE — алгоритм поиска слабого звена завершен, необходимо провести
     перерасчет уровня знаний по темам.
     """
@@ -129,10 +105,21 @@ class WeakestLinkState(models.TextChoices):
 
 
 class UserWeakestLinkState(AbstractUserSemester):
-    """Состояние алгоритма поиска слабого звена."""
+    """Состояние алгоритма поиска слабого звена вместе с его очередью.
+    Строка изменяется одним UPDATE с проверкой версии, поэтому параллельные
+    ответы не могут перезаписать изменения друг друга.
+
+    problems — очередь заданий: словари с id задания (problem), номером
+    группы (group_number) и правильностью ответа (is_solved).
+    topics — проблемные темы: словари с id темы (topic) и номером группы.
+    version — увеличивается при каждом сохранении.
+    """
     state = models.CharField(max_length=11,
                              choices=WeakestLinkState.choices,
                              default=WeakestLinkState.NONE)
+    problems = models.JSONField(default=list, blank=True)
+    topics = models.JSONField(default=list, blank=True)
+    version = models.PositiveBigIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -146,14 +133,54 @@ class UserWeakestLinkState(AbstractUserSemester):
                 f' state={self.state}')
 
 
+class UserProgressVersion(AbstractUserSemester):
+    """Версия состояния студента в семестре. Увеличивается при каждом
+    изменении, влияющем на подбор заданий, и используется для проверки
+    актуальности заранее подобранных заданий.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'semester'],
+                                    name='unique_user_semester_progress_version')
+        ]
+
+    def __str__(self):
+        return (f'semester={self.semester}, user={self.user},'
+                f' version={self.version}')
+
+
 class TopicGraphEdge(models.Model):
-    """Грани графа связи тем."""
+    """Грани графа связи тем. co_failure_count и co_success_count —
+    количество неправильных и правильных ответов на задания, в темы
+    которых входят обе темы грани.
+    """
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     topic1 = models.ForeignKey(Topic, on_delete=models.CASCADE,
                                related_name='topic_topicgraphedge_set1')
     topic2 = models.ForeignKey(Topic, on_delete=models.CASCADE,
                                related_name='topic_topicgraphedge_set2')
     weight = models.FloatField()
+    co_failure_count = models.PositiveIntegerField(default=0)
+    co_success_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'topic1', 'topic2'],
+                                    name='unique_course_topic1_topic2')
+        ]
 
     def __str__(self):
         return f'{self.topic1} -> {self.topic2} ({self.weight})'
+
+
+class TopicGraphLearningState(models.Model):
+    """Состояние расчета весов графа связи тем по ответам пользователей:
+    ответы, созданные не позже last_answer_created_at, уже учтены.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True)
+    last_answer_created_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.course} ({self.last_answer_created_at})'
@@ -0,0 +1,153 @@
+import logging
+
+import numpy as np
+from django.contrib.auth.models import User
+
+from algorithm.models import UserTargetPoints, TargetPoints, WeakestLinkState
+from config.settings import Constants
+from courses.models import Problem, Semester, Difficulty
+from .points_maximization import calculate_values_by_progress, get_min_values_order
+from .problem_catalog import ProblemCatalog, get_problem_catalog
+from .problem_selector import next_practice_problem
+from .student_snapshot import StudentSnapshot
+from .utils import get_theory_threshold_low, get_suitable_problem_difficulties
+from ..utils import format_log_problem
+
+logger = logging.getLogger(__name__)
+
+
+def next_practice_problems(students: list[tuple[User, Semester]]) -> list[Problem | None]:
+    """Подбирает следующее практическое задание для каждой пары (студент, семестр).
+    Возвращает задания в порядке пар, None — если доступных заданий нет.
+    """
+    users_by_semester = {}
+    semesters = {}
+    for user, semester in students:
+        semesters[semester.id] = semester
+        users_by_semester.setdefault(semester.id, {})[user.id] = user
+    problems = {}
+    for semester_id, users in users_by_semester.items():
+        for user_id, problem in select_practice_problems(list(users.values()), semesters[semester_id]).items():
+            problems[(user_id, semester_id)] = problem
+    return [problems[(user.id, semester.id)] for user, semester in students]
+
+
+def select_practice_problems(users: list[User], semester: Semester) -> dict[int, Problem | None]:
+    """Подбирает следующее практическое задание для студентов семестра.
+    Снимки состояния загружаются одним набором запросов на всех студентов,
+    каталог заданий курса и таблица подходящей сложности используются
+    общие, а стоимость заданий рассчитывается за один векторный проход.
+    Студентам, у которых запущен поиск слабого звена, задание подбирается
+    next_practice_problem. Ключ словаря — id пользователя.
+    """
+    snapshots = StudentSnapshot.load_many(users, semester)
+    target_points = dict(UserTargetPoints.objects.filter(
+        user_id__in=list(snapshots)
+    ).values_list('user_id', 'target_points'))
+    problems = {}
+    regular_snapshots = []
+    for user_id, snapshot in snapshots.items():
+        if snapshot.weakest_link_state == WeakestLinkState.IN_PROGRESS:
+            try:
+                problems[user_id] = next_practice_problem(snapshot.user, semester, snapshot)
+            except ValueError:
+                problems[user_id] = None
+        else:
+            regular_snapshots.append(snapshot)
+    if not regular_snapshots:
+        return problems
+    catalog = get_problem_catalog(semester.course_id)
+    problem_indices = select_practice_problem_indices(
+        catalog, regular_snapshots,
+        np.array([target_points.get(snapshot.user.id, TargetPoints.HIGH) for snapshot in regular_snapshots])
+    )
+    selected_problems = Problem.objects.in_bulk([catalog.problem_ids[i] for i in problem_indices if i >= 0])
+    for snapshot, i in zip(regular_snapshots, problem_indices):
+        problem = None if i < 0 else selected_problems.get(catalog.problem_ids[i])
+        if problem is None:
+            logger.error(f'( ! ) {snapshot.user.username:<10} [доступных практических заданий нет]')
+        else:
+            logger.info(f'(   ) {format_log_problem(snapshot.user, problem)} [пакетный подбор]')
+        problems[snapshot.user.id] = problem
+    return problems
+
+
+def select_practice_problem_indices(catalog: ProblemCatalog, snapshots: list[StudentSnapshot],
+                                    target_points: np.ndarray) -> np.ndarray:
+    """Возвращает индекс самого ценного практического задания каталога
+    для каждого снимка или -1, если доступных заданий нет.
+    Отбор совпадает с filter_practice_problems_from_catalog, включая
+    повышение допустимой сложности, если подходящих заданий нет.
+    """
+    number_of_topics = len(catalog.topic_ids)
+    shape = (len(snapshots), number_of_topics)
+    theory_points = np.zeros(shape)
+    practice_points = np.zeros(shape)
+    skill_levels = np.full(shape, Constants.AVERAGE_SKILL_LEVEL)
+    has_progress = np.zeros(shape, dtype=bool)
+    is_answered = np.zeros((len(snapshots), len(catalog)), dtype=bool)
+    for i, snapshot in enumerate(snapshots):
+        for topic_id, progress in snapshot.progresses.items():
+            j = catalog.topic_index.get(topic_id)
+            if j is not None:
+                theory_points[i, j] = progress.theory_points
+                practice_points[i, j] = progress.practice_points
+                skill_levels[i, j] = progress.skill_level
+                has_progress[i, j] = True
+        is_answered[i] = catalog.problem_mask(snapshot.answered_problem_ids)
+
+    is_theory_low_reached = has_progress & (theory_points >= get_theory_threshold_low())
+    is_available_topic = is_theory_low_reached & (practice_points < Constants.TOPIC_PRACTICE_MAX_POINTS)
+    is_not_completed_topic = has_progress & (theory_points + practice_points < target_points[:, np.newaxis])
+    sub_topics = np.unpackbits(catalog.sub_topic_bits, axis=1, count=number_of_topics).astype(bool)
+    has_completed_sub_topic = (is_theory_low_reached.astype(np.int32) @ sub_topics.T.astype(np.int32)) > 0
+    candidates = ((~catalog.has_sub_topics | has_completed_sub_topic) & ~is_answered & catalog.is_practice
+                  & np.take(is_not_completed_topic, catalog.main_topics, axis=1))
+
+    max_difficulties = np.where(is_available_topic, get_suitable_problem_difficulties(skill_levels), 0)
+    suitable = candidates & (catalog.difficulties <= np.take(max_difficulties, catalog.main_topics, axis=1))
+    for max_difficulty in (Difficulty.NORMAL, Difficulty.HARD):
+        is_empty = ~suitable.any(axis=1)
+        suitable[is_empty] = candidates[is_empty] & (catalog.difficulties <= max_difficulty)
+
+    values = calculate_values_by_progress(
+        theory_points, practice_points, skill_levels,
+        main_topic_indices=catalog.main_topics,
+        sub_topic_indices=get_sub_topic_indices(sub_topics, get_topic_order(catalog, snapshots)),
+        is_theory=~catalog.is_practice,
+        difficulties=catalog.difficulties,
+        times_to_solve=catalog.times_to_solve,
+        has_progress=has_progress
+    )
+    problem_indices = np.full(len(snapshots), -1)
+    has_available_topic = is_available_topic.any(axis=1)
+    for i in range(len(snapshots)):
+        indices = np.flatnonzero(suitable[i])
+        if has_available_topic[i] and len(indices):
+            problem_indices[i] = indices[get_min_values_order(values[i, indices], limit=1)[0]]
+    return problem_indices
+
+
+def get_topic_order(catalog: ProblemCatalog, snapshots: list[StudentSnapshot]) -> np.ndarray:
+    """Возвращает порядковый номер каждой темы каталога в порядке сортировки
+    Progress, чтобы баллы по подтемам суммировались так же, как при подборе
+    для одного студента.
+    """
+    order = np.full(len(catalog.topic_ids), len(catalog.topic_ids))
+    progresses = max((snapshot.progresses for snapshot in snapshots), key=len)
+    for i, topic_id in enumerate(progresses):
+        if topic_id in catalog.topic_index:
+            order[catalog.topic_index[topic_id]] = i
+    return order
+
+
+def get_sub_topic_indices(sub_topics: np.ndarray, topic_order: np.ndarray) -> np.ndarray:
+    """Возвращает матрицу индексов подтем каждого задания в порядке topic_order,
+    отсутствующие значения заполнены -1.
+    """
+    width = int(sub_topics.sum(axis=1).max(initial=0))
+    sub_topic_indices = np.full((len(sub_topics), width), -1)
+    for i, row in enumerate(sub_topics):
+        indices = np.flatnonzero(row)
+        sub_topic_indices[i, :len(indices)] = indices[np.argsort(topic_order[indices], kind='stable')]
+    return sub_topic_indices
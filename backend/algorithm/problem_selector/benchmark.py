@@ -0,0 +1,171 @@
+import random
+import time
+from itertools import combinations
+from typing import Callable, Any
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from prettytable import PrettyTable
+
+from algorithm.models import Progress
+from algorithm.problem_selector.topic_graph import (TopicGraph, Edge, split_in_two_groups_exact,
+                                                   split_in_two_groups_kernighan_lin, build_topic_graph)
+from algorithm.problem_selector.utils import (filter_problems, get_available_progresses,
+                                              filter_problems_with_suitable_difficulty,
+                                              get_suitable_problem_difficulty)
+from courses.models import Course, Semester, Problem, Topic, PRACTICE_TYPES
+
+
+def measure(function: Callable[[], Any], repeat: int = 5) -> tuple[Any, int, float]:
+    """Выполняет функцию без аргументов repeat раз и возвращает результат
+    последнего запуска, количество запросов к БД за один запуск и среднее
+    время выполнения в секундах.
+    """
+    result = None
+    number_of_queries = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as context:
+            result = function()
+            if isinstance(result, QuerySet):
+                result = list(result)
+        number_of_queries = len(context)
+    return result, number_of_queries, (time.perf_counter() - start) / repeat
+
+
+def print_benchmark_results(title: str, rows: list[tuple[str, int, float]]):
+    """Выводит таблицу с количеством запросов и временем выполнения."""
+    table = PrettyTable()
+    table.title = title
+    table.field_names = ['реализация', 'запросы', 'время, мс']
+    for name, number_of_queries, seconds in rows:
+        table.add_row([name, number_of_queries, f'{seconds * 1000:.2f}'])
+    print(table)
+
+
+def filter_problems_with_suitable_difficulty_per_problem(problems: QuerySet[Problem],
+                                                         available_progresses: QuerySet[Progress]
+                                                         ) -> QuerySet[Problem]:
+    """Прежняя реализация filter_problems_with_suitable_difficulty
+    с запросом прогресса на каждое задание. Используется как эталон.
+    """
+    appropriate_problem_ids = []
+    for problem in problems:
+        progress = available_progresses.filter(topic=problem.main_topic).first()
+        if progress is None:
+            continue
+        difficulty = get_suitable_problem_difficulty(progress.skill_level)
+        if problem.difficulty <= difficulty.value:
+            appropriate_problem_ids.append(problem.id)
+    return Problem.objects.filter(id__in=appropriate_problem_ids)
+
+
+def benchmark_filter_problems_with_suitable_difficulty(username: str, course_title: str = 'Test Course',
+                                                       repeat: int = 5):
+    """Сравнивает filter_problems_with_suitable_difficulty с построчной
+    реализацией на практических заданиях студента: проверяет совпадение
+    отобранных заданий и выводит количество запросов и время выполнения.
+    """
+    user = User.objects.get(username=username)
+    semester = Semester.objects.get(course__title=course_title)
+    problems = filter_problems(user, semester).filter(type__in=PRACTICE_TYPES)
+    available_progresses = get_available_progresses(user, semester)
+    expected, expected_queries, expected_seconds = measure(
+        lambda: filter_problems_with_suitable_difficulty_per_problem(problems.all(), available_progresses.all()),
+        repeat=repeat
+    )
+    actual, actual_queries, actual_seconds = measure(
+        lambda: filter_problems_with_suitable_difficulty(problems.all(), available_progresses.all()),
+        repeat=repeat
+    )
+    if {problem.id for problem in expected} != {problem.id for problem in actual}:
+        raise ValueError('Отобранные задания не совпадают с эталонной реализацией.')
+    print_benchmark_results(f'filter_problems_with_suitable_difficulty ({len(actual)} заданий)', [
+        ('построчная', expected_queries, expected_seconds),
+        ('один запрос', actual_queries, actual_seconds),
+    ])
+
+
+def split_topics_in_two_groups_brute_force(topic_graph: TopicGraph,
+                                           topics: set[Topic]) -> tuple[set[Topic], set[Topic]]:
+    """Прежняя реализация TopicGraph.split_topics_in_two_groups
+    с перебором всех пар сочетаний тем. Используется как эталон.
+    """
+    middle = int(len(topics) / 2)
+    group_combinations1 = list(combinations(topics, middle))
+    group_combinations2 = list(combinations(topics, len(topics) - middle))
+    max_weight = 0.0
+    final_groups = ()
+    for combination1 in group_combinations1:
+        for combination2 in group_combinations2:
+            if set(combination1 + combination2) != set(topics):
+                continue
+            weight = topic_graph.calc_topic_group_weight(combination1)
+            weight += topic_graph.calc_topic_group_weight(combination2)
+            if weight > max_weight:
+                max_weight = weight
+                final_groups = set(combination1), set(combination2)
+    return final_groups
+
+
+def create_random_topic_graph(number_of_topics: int, seed: int = 42) -> TopicGraph:
+    """Создает граф несохраненных тем со случайными весами связей."""
+    rng = random.Random(seed)
+    topics = [Topic(title=f'Topic {i}') for i in range(number_of_topics)]
+    edges = [Edge(topic1_id=topic1.id, topic2_id=topic2.id, weight=rng.random())
+             for topic1 in topics for topic2 in topics if topic1 != topic2]
+    return TopicGraph(topics, edges)
+
+
+def benchmark_split_topics_in_two_groups(sizes: tuple[int] = (6, 8, 10, 12, 14, 18, 24, 40),
+                                         max_brute_force_size: int = 12, seed: int = 42):
+    """Сравнивает точное разбиение тем на группы, эвристику Кернигана — Лина
+    и полный перебор на случайных графах: проверяет, что точное разбиение
+    совпадает по весу с перебором, и выводит суммарный вес связей внутри
+    групп и время выполнения.
+    """
+    table = PrettyTable()
+    table.title = 'split_topics_in_two_groups'
+    table.field_names = ['тем', 'реализация', 'вес', 'время, мс']
+    for number_of_topics in sizes:
+        topic_graph = create_random_topic_graph(number_of_topics, seed)
+        topic_set = set(topic_graph.topics)
+        topics = list(topic_set)
+        weights = topic_graph.get_weight_matrix(topics)
+        implementations = [('Керниган — Лин', lambda: split_in_two_groups_kernighan_lin(weights))]
+        if number_of_topics <= 24:
+            implementations.insert(0, ('битовые маски', lambda: split_in_two_groups_exact(weights)))
+        if number_of_topics <= max_brute_force_size:
+            implementations.insert(0, ('перебор', lambda: get_group_mask(
+                topics, split_topics_in_two_groups_brute_force(topic_graph, topic_set)[0]
+            )))
+        group_weights = {}
+        for name, function in implementations:
+            start = time.perf_counter()
+            group = function()
+            seconds = time.perf_counter() - start
+            group_weights[name] = (weights[np.ix_(group, group)].sum() + weights[np.ix_(~group, ~group)].sum()) / 2
+            table.add_row([number_of_topics, name, f'{group_weights[name]:.4f}', f'{seconds * 1000:.2f}'])
+        if 'перебор' in group_weights and not np.isclose(group_weights['перебор'], group_weights['битовые маски']):
+            raise ValueError('Вес точного разбиения не совпадает с перебором.')
+    print(table)
+
+
+def get_group_mask(topics: list[Topic], group: set[Topic]) -> np.ndarray:
+    """Возвращает маску тем из списка, входящих в группу."""
+    return np.array([topic in group for topic in topics])
+
+
+def benchmark_build_topic_graph(course_title: str = 'Test Course', repeat: int = 5):
+    """Выводит количество запросов и время построения графа связей тем курса."""
+    course = Course.objects.get(title=course_title)
+    topic_graph, number_of_queries, seconds = measure(lambda: build_topic_graph(course.id), repeat=repeat)
+    print_benchmark_results(f'build_topic_graph ({len(topic_graph.topics)} тем,'
+                            f' {len(topic_graph.weight_data)} связей)', [
+        ('CSR', number_of_queries, seconds),
+    ])
+
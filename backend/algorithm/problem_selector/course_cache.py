@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+from uuid import UUID
+
+
+class CourseCache:
+    """Кэш данных курса в памяти процесса с ключом по id курса.
+    Хранит не более max_size записей (вытесняются давно не использованные)
+    и не дольше timeout_seconds, считает попадания и промахи.
+    """
+
+    def __init__(self, build: Callable[[UUID], Any], max_size: int, timeout_seconds: float):
+        self.build = build
+        self.max_size = max_size
+        self.timeout_seconds = timeout_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[UUID, tuple[float, Any]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, course_id: UUID) -> Any:
+        """Возвращает данные курса, строя их при отсутствии или устаревании записи.
+        Данные, построенные во время сброса кэша, не сохраняются.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(course_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(course_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = self.build(course_id)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[course_id] = (now + self.timeout_seconds, value)
+                self._entries.move_to_end(course_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, course_id: UUID = None):
+        """Удаляет данные курса. Если курс не указан, удаляются данные всех курсов."""
+        with self._lock:
+            self._generation += 1
+            if course_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(course_id, None)
+
+    def get_stats(self) -> dict[str, int]:
+        """Возвращает количество записей, попаданий и промахов."""
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
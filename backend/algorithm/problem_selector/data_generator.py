@@ -1,11 +1,11 @@
 import random
 
 from django.contrib.auth.models import User
+from django.db.models import F
 from django.utils import timezone
 
 from algorithm.models import (TopicGraphEdge, Progress, UserWeakestLinkState,
-                              WeakestLinkState, UserAnswer, WeakestLinkProblem,
-                              WeakestLinkTopic)
+                              WeakestLinkState, UserAnswer)
 from algorithm.utils import create_user_progress_if_not_exists
 from answers.models import (MultipleChoiceRadio, MultipleChoiceCheckbox,
                             FillInSingleBlank)
@@ -172,16 +172,10 @@ def generate_number_of_sub_topics(number_of_available_sub_topics: int) -> int:
 def create_random_topic_graph(topics: list[Topic]):
     """Создает граф тем со случайными весами."""
     course = topics[0].module.course
-    for topic1 in topics:
-        for topic2 in topics:
-            if topic1 == topic2:
-                continue
-            TopicGraphEdge.objects.create(
-                course=course,
-                topic1=topic1,
-                topic2=topic2,
-                weight=random.random()
-            )
+    TopicGraphEdge.objects.bulk_create([
+        TopicGraphEdge(course=course, topic1=topic1, topic2=topic2, weight=random.random())
+        for topic1 in topics for topic2 in topics if topic1 != topic2
+    ])
 
 
 def create_random_answers(course: Course):
@@ -237,11 +231,9 @@ def clear_progresses_for_all_users_and_semesters():
 
 
 def clear_user_weakest_link_states():
-    """Сбрасывает статус алгоритма поиска слабого звена."""
-    user_weakest_link_states = UserWeakestLinkState.objects.all()
-    for state in user_weakest_link_states:
-        state.state = WeakestLinkState.NONE
-        state.save()
+    """Сбрасывает статус и очередь алгоритма поиска слабого звена."""
+    UserWeakestLinkState.objects.update(state=WeakestLinkState.NONE, problems=[], topics=[],
+                                        version=F('version') + 1)
 
 
 def delete_and_clear_all_objects():
@@ -251,8 +243,6 @@ def delete_and_clear_all_objects():
     UserAnswer.objects.all().delete()
     clear_progresses_for_all_users_and_semesters()
     clear_user_weakest_link_states()
-    WeakestLinkProblem.objects.all().delete()
-    WeakestLinkTopic.objects.all().delete()
 
 
 def reset_semesters_without_disenroll():
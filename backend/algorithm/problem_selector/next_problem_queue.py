@@ -0,0 +1,96 @@
+from uuid import UUID
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+from config.settings import Constants
+from courses.models import Problem, Semester
+from .problem_selector import next_theory_problem, next_practice_problem
+from .student_snapshot import StudentSnapshot
+from ..utils import get_progress_version
+
+PRACTICE_QUEUE_NAME = 'practice'
+NEXT_PROBLEM_CACHE = 'next_problem'
+
+
+def get_next_problem_queue_key(user_id: int, semester_id: UUID) -> str:
+    """Возвращает ключ очереди заранее подобранных заданий студента в кэше."""
+    return f'next_problem_queue:{user_id}:{semester_id}'
+
+
+def get_queue_name(topic_id: UUID | None) -> str:
+    """Возвращает название очереди: id темы для теоретических заданий
+    или practice для практических.
+    """
+    return PRACTICE_QUEUE_NAME if topic_id is None else str(topic_id)
+
+
+def prefetch_next_problem(user_id: int, semester_id: UUID, topic_id: UUID = None):
+    """Подбирает следующее задание студента и помещает его в очередь.
+    Если указан topic_id, подбирается теоретическое задание по теме,
+    иначе практическое. Задание не сохраняется, если во время подбора
+    изменилась версия состояния студента.
+    """
+    version = get_progress_version(user_id, semester_id)
+    user = User.objects.get(pk=user_id)
+    semester = Semester.objects.get(pk=semester_id)
+    try:
+        problem = find_next_problem(user, semester, topic_id)
+    except ValueError:
+        return
+    if get_progress_version(user_id, semester_id) != version:
+        return
+    store_prefetched_problem(user_id, semester_id, version, problem, topic_id)
+
+
+def select_next_problem(user: User, semester: Semester, topic_id: UUID = None) -> Problem:
+    """Возвращает следующее задание студента: теоретическое по теме topic_id
+    или практическое, если тема не указана. Пока версия состояния студента
+    не изменилась, повторно возвращается последнее подобранное задание
+    без повторного подбора. Иначе задание подбирается заново и запоминается.
+    """
+    problem = get_prefetched_problem(user, semester, topic_id)
+    if problem is not None:
+        return problem
+    version = get_progress_version(user.id, semester.id)
+    problem = find_next_problem(user, semester, topic_id)
+    if get_progress_version(user.id, semester.id) == version:
+        store_prefetched_problem(user.id, semester.id, version, problem, topic_id)
+    return problem
+
+
+def find_next_problem(user: User, semester: Semester, topic_id: UUID = None) -> Problem:
+    """Подбирает следующее задание студента по снимку его состояния."""
+    snapshot = StudentSnapshot.load(user, semester)
+    if topic_id is None:
+        return next_practice_problem(user, semester, snapshot)
+    return next_theory_problem(snapshot.get_progress(topic_id), snapshot)
+
+
+def store_prefetched_problem(user_id: int, semester_id: UUID, version: int,
+                             problem: Problem, topic_id: UUID = None):
+    """Помещает задание, подобранное при версии состояния студента version,
+    в очередь теоретических заданий по теме topic_id или практических заданий.
+    """
+    cache = caches[NEXT_PROBLEM_CACHE]
+    key = get_next_problem_queue_key(user_id, semester_id)
+    queue = cache.get(key)
+    if queue is None or queue['version'] != version:
+        queue = {'version': version, 'problems': {}}
+    queue['problems'][get_queue_name(topic_id)] = problem.id
+    cache.set(key, queue, Constants.NEXT_PROBLEM_QUEUE_TIMEOUT_SECONDS)
+
+
+def get_prefetched_problem(user: User, semester: Semester, topic_id: UUID = None) -> Problem | None:
+    """Возвращает заранее подобранное задание из очереди студента
+    (теоретическое по теме topic_id или практическое, если тема не указана).
+    Возвращает None, если задания нет или версия состояния студента
+    изменилась с момента подбора.
+    """
+    queue = caches[NEXT_PROBLEM_CACHE].get(get_next_problem_queue_key(user.id, semester.id))
+    if queue is None:
+        return None
+    problem_id = queue['problems'].get(get_queue_name(topic_id))
+    if problem_id is None or queue['version'] != get_progress_version(user.id, semester.id):
+        return None
+    return Problem.objects.filter(pk=problem_id).first()
@@ -1,12 +1,15 @@
 import logging
+from uuid import UUID
 
 import math
+import numpy as np
 from django.contrib.auth.models import User
 from django.db.models import QuerySet
 
 from algorithm.models import Progress
+from algorithm.problem_selector.student_snapshot import StudentSnapshot
 from config.settings import Constants
-from courses.models import Semester, Problem, Difficulty, Type, THEORY_TYPES
+from courses.models import Semester, Problem, Difficulty, THEORY_TYPES
 
 POINTS_BY_DIFFICULTY = {
     Difficulty.EASY.value: Constants.POINTS_EASY,
@@ -23,106 +26,149 @@ DIFFICULTY_TO_POINTS_THRESHOLD = {
 }
 
 
-def get_problems_with_max_value(user: User, semester: Semester, problems: QuerySet[Problem]) -> list[Problem]:
-    """Возвращает задания, отсортированные в порядке убывания их ценности."""
-    problems_with_value = []
-    for problem in problems:
-        value = calculate_problem_value(user, semester, problem)
-        problems_with_value.append((problem, value))
-    problems_with_value.sort(key=lambda x: x[1])
-    for problem, value in problems_with_value[:15]:
+def get_problems_with_max_value(user: User, semester: Semester, problems: QuerySet[Problem],
+                                snapshot: StudentSnapshot = None, limit: int = None) -> list[Problem]:
+    """Возвращает задания, отсортированные в порядке убывания их ценности.
+    Если указан limit, возвращает только limit самых ценных заданий.
+    """
+    problems = list(problems)
+    values = calculate_problem_values(user, semester, problems, snapshot)
+    order = get_min_values_order(values, limit)
+    for i in order[:15]:
+        problem = problems[i]
         logger.info(f'(   ) {user.username:<10} {problem.title:<25}'
                     f' {problem.difficulty} {problem.time_to_solve_in_seconds:<6}'
-                    f' value={value}')
-    return [problem for problem, _ in problems_with_value]
+                    f' value={values[i]}')
+    return [problems[i] for i in order]
 
 
-def calculate_problem_value(user: User, semester: Semester, problem: Problem) -> float:
-    """Рассчитывает "стоимость" задания, основываясь на прогрессе тем этого
-    задания, уровне знаний и времени на решение.
+def get_min_values_order(values: np.ndarray, limit: int = None) -> np.ndarray:
+    """Возвращает индексы limit наименьших значений в порядке возрастания
+    (все индексы, если limit не указан). Равные значения сохраняют исходный
+    порядок, как при устойчивой сортировке. Бесконечные значения в отборе
+    не участвуют и добавляются в конец, только если конечных не хватает.
     """
-    progress = Progress.objects.get(user=user, semester=semester, topic=problem.main_topic)
-    skill_level_coefficient = Constants.AVERAGE_SKILL_LEVEL / progress.skill_level
-    weighted_time_to_solve = problem.time_to_solve_in_seconds * skill_level_coefficient
-    points = calculate_points_if_problem_solved_correctly(progress, problem)
-    return math.inf if points == 0 else weighted_time_to_solve / (points * threshold_coefficient(progress))
-
-
-def threshold_coefficient(progress: Progress) -> float:
-    """Возвращает коэффициент ценности темы в зависимости от количества баллов."""
-    if progress.points < Constants.TOPIC_THRESHOLD_LOW:
-        return Constants.TOPIC_THRESHOLD_LOW_COEFFICIENT
-    if progress.points < Constants.TOPIC_THRESHOLD_MEDIUM:
-        return Constants.TOPIC_THRESHOLD_MEDIUM_COEFFICIENT
-    return Constants.TOPIC_THRESHOLD_HIGH_COEFFICIENT
-
-
-def calculate_points_if_problem_solved_correctly(progress: Progress, problem: Problem) -> float:
-    """Возвращает общее количество баллов, которое получит пользователь при
-    правильном решении задания.
+    is_finite = values != math.inf
+    finite = np.flatnonzero(is_finite)
+    if limit is not None and limit < len(finite):
+        kth_value = np.partition(values[finite], limit - 1)[limit - 1]
+        finite = finite[values[finite] <= kth_value]
+    order = finite[np.argsort(values[finite], kind='stable')]
+    if limit is not None and len(order) >= limit:
+        return order[:limit]
+    order = np.concatenate([order, np.flatnonzero(~is_finite)])
+    return order if limit is None else order[:limit]
+
+
+def calculate_problem_values(user: User, semester: Semester, problems: list[Problem],
+                             snapshot: StudentSnapshot = None) -> np.ndarray:
+    """Рассчитывает "стоимость" каждого задания из списка, основываясь
+    на прогрессе тем задания, уровне знаний и времени на решение. Прогресс
+    пользователя и подтемы заданий загружаются одним запросом на всех
+    кандидатов. Если передан снимок состояния студента, прогресс берется из него.
     """
-    sub_topics_progresses = Progress.objects.filter(
-        user=progress.user,
-        semester=progress.semester,
-        topic__in=problem.sub_topics.all()
+    if not problems:
+        return np.empty(0)
+    if snapshot is not None:
+        progresses = list(snapshot.progresses.values())
+    else:
+        progresses = list(Progress.objects.filter(user=user, semester=semester))
+    topic_index = {progress.topic_id: i for i, progress in enumerate(progresses)}
+    try:
+        main_topic_indices = np.array([topic_index[problem.main_topic_id] for problem in problems])
+    except KeyError:
+        raise Progress.DoesNotExist('Progress matching query does not exist.')
+    sub_topic_indices = get_sub_topic_progress_indices(problems, topic_index)
+
+    theory_points = np.array([progress.theory_points for progress in progresses])
+    practice_points = np.array([progress.practice_points for progress in progresses])
+    skill_levels = np.array([progress.skill_level for progress in progresses])
+    return calculate_values_by_progress(
+        theory_points, practice_points, skill_levels,
+        main_topic_indices=main_topic_indices,
+        sub_topic_indices=sub_topic_indices,
+        is_theory=np.array([problem.type in THEORY_TYPES for problem in problems]),
+        difficulties=np.array([problem.difficulty for problem in problems]),
+        times_to_solve=np.array([problem.time_to_solve_in_seconds for problem in problems])
     )
-    main_topic_points = POINTS_BY_DIFFICULTY[problem.difficulty]
-    sub_topic_points = POINTS_BY_DIFFICULTY[problem.difficulty] * Constants.SUB_TOPIC_POINTS_COEFFICIENT
-    total_points = main_topic_points_if_problem_solved_correctly(progress, main_topic_points, problem)
-    for sub_topic_progress in sub_topics_progresses:
-        total_points += sub_topic_points_if_problem_solved_correctly(sub_topic_progress,
-                                                                     sub_topic_points, problem)
-    return total_points
-
-
-def main_topic_points_if_problem_solved_correctly(progress: Progress,
-                                                  points: float,
-                                                  problem: Problem) -> float:
-    """Возвращает количество баллов, которое получит пользователь по основной теме,
-    если решит теоретическое или практическое задание правильно.
-    """
-    points_threshold = DIFFICULTY_TO_POINTS_THRESHOLD[problem.difficulty]
-    if progress.points >= points_threshold:
-        return 0
-    elif progress.points + points >= points_threshold:
-        points = points_threshold - progress.points
-    return points_if_problem_solved_correctly(progress, points, problem)
-
-
-def sub_topic_points_if_problem_solved_correctly(progress: Progress,
-                                                 points: float,
-                                                 problem: Problem) -> float:
-    """Возвращает количество баллов, которое получит пользователь по подтеме,
-    если решит теоретическое или практическое задание правильно.
-    """
-    if progress.points >= Constants.SUB_TOPIC_POINTS_THRESHOLD:
-        return 0
-    elif progress.points + points >= Constants.SUB_TOPIC_POINTS_THRESHOLD:
-        points = Constants.SUB_TOPIC_POINTS_THRESHOLD - progress.points
-    return points_if_problem_solved_correctly(progress, points, problem)
 
 
-def points_if_problem_solved_correctly(progress: Progress, points: float, problem: Problem) -> float:
-    """Возвращает количество баллов, которое получит пользователь,
-    если решит теоретическое или практическое задание правильно.
+def calculate_values_by_progress(theory_points: np.ndarray, practice_points: np.ndarray,
+                                 skill_levels: np.ndarray, main_topic_indices: np.ndarray,
+                                 sub_topic_indices: np.ndarray, is_theory: np.ndarray,
+                                 difficulties: np.ndarray, times_to_solve: np.ndarray,
+                                 has_progress: np.ndarray = None) -> np.ndarray:
+    """Рассчитывает "стоимость" заданий по массивам прогресса по темам.
+    Массивы прогресса могут иметь первую ось по студентам, тогда результат
+    рассчитывается для каждого студента (строка — студент, столбец — задание).
+    has_progress отмечает темы, по которым у студента есть прогресс,
+    подтемы без прогресса не учитываются.
     """
-    current_points, max_points = get_points_by_problem_type(progress, Type(problem.type))
-    if current_points >= max_points:
-        return 0
-    elif current_points + points > max_points:
-        return max_points - current_points
-    else:
-        return points
+    points_by_difficulty = np.array([POINTS_BY_DIFFICULTY[d] for d in difficulties], dtype=np.float64)
+    points_thresholds = np.array([DIFFICULTY_TO_POINTS_THRESHOLD[d] for d in difficulties], dtype=np.float64)
+
+    max_points = np.where(is_theory, Constants.TOPIC_THEORY_MAX_POINTS, Constants.TOPIC_PRACTICE_MAX_POINTS)
+    topic_points = theory_points + practice_points
+
+    main_points = np.take(topic_points, main_topic_indices, axis=-1)
+    points = np.where(main_points + points_by_difficulty >= points_thresholds,
+                      points_thresholds - main_points, points_by_difficulty)
+    current_points = np.where(is_theory, np.take(theory_points, main_topic_indices, axis=-1),
+                              np.take(practice_points, main_topic_indices, axis=-1))
+    points = cap_points_by_problem_type(current_points, max_points, points)
+    total_points = np.where(main_points >= points_thresholds, 0.0, points)
+
+    sub_topic_points = points_by_difficulty * Constants.SUB_TOPIC_POINTS_COEFFICIENT
+    for column in sub_topic_indices.T:
+        has_sub_topic = column >= 0
+        column = np.where(has_sub_topic, column, 0)
+        if has_progress is not None:
+            has_sub_topic = has_sub_topic & np.take(has_progress, column, axis=-1)
+        sub_points = np.take(topic_points, column, axis=-1)
+        points = np.where(sub_points + sub_topic_points >= Constants.SUB_TOPIC_POINTS_THRESHOLD,
+                          Constants.SUB_TOPIC_POINTS_THRESHOLD - sub_points, sub_topic_points)
+        current_points = np.where(is_theory, np.take(theory_points, column, axis=-1),
+                                  np.take(practice_points, column, axis=-1))
+        points = cap_points_by_problem_type(current_points, max_points, points)
+        points[sub_points >= Constants.SUB_TOPIC_POINTS_THRESHOLD] = 0.0
+        total_points = total_points + np.where(has_sub_topic, points, 0.0)
+
+    skill_level_coefficients = Constants.AVERAGE_SKILL_LEVEL / np.take(skill_levels, main_topic_indices, axis=-1)
+    weighted_times_to_solve = times_to_solve * skill_level_coefficients
+    threshold_coefficients = np.select(
+        [main_points < Constants.TOPIC_THRESHOLD_LOW, main_points < Constants.TOPIC_THRESHOLD_MEDIUM],
+        [Constants.TOPIC_THRESHOLD_LOW_COEFFICIENT, Constants.TOPIC_THRESHOLD_MEDIUM_COEFFICIENT],
+        Constants.TOPIC_THRESHOLD_HIGH_COEFFICIENT
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = weighted_times_to_solve / (total_points * threshold_coefficients)
+    return np.where(total_points == 0, math.inf, values)
 
 
-def get_points_by_problem_type(progress: Progress, problem_type: Type) -> tuple[float, float]:
-    """Возвращает текущее количество баллов и максимально доступное
-    в зависимости от типа задания.
+def get_sub_topic_progress_indices(problems: list[Problem], topic_index: dict[UUID, int]) -> np.ndarray:
+    """Возвращает матрицу индексов прогрессов подтем каждого задания.
+    Подтемы упорядочены так же, как прогрессы пользователя, отсутствующие
+    значения заполнены -1.
     """
-    if problem_type in THEORY_TYPES:
-        current_points = progress.theory_points
-        max_points = Constants.TOPIC_THEORY_MAX_POINTS
-    else:
-        current_points = progress.practice_points
-        max_points = Constants.TOPIC_PRACTICE_MAX_POINTS
-    return current_points, max_points
+    problem_index = {problem.id: i for i, problem in enumerate(problems)}
+    sub_topics = [[] for _ in problems]
+    memberships = Problem.sub_topics.through.objects.filter(
+        problem_id__in=list(problem_index)
+    ).values_list('problem_id', 'topic_id')
+    for problem_id, topic_id in memberships:
+        if topic_id in topic_index:
+            sub_topics[problem_index[problem_id]].append(topic_index[topic_id])
+    width = max(len(indices) for indices in sub_topics)
+    sub_topic_indices = np.full((len(problems), width), -1)
+    for i, indices in enumerate(sub_topics):
+        sub_topic_indices[i, :len(indices)] = sorted(indices)
+    return sub_topic_indices
+
+
+def cap_points_by_problem_type(current_points: np.ndarray, max_points: np.ndarray,
+                               points: np.ndarray) -> np.ndarray:
+    """Ограничивает баллы за правильное решение задания максимальным
+    количеством баллов по теории или практике.
+    """
+    return np.where(current_points >= max_points, 0.0,
+                    np.where(current_points + points > max_points, max_points - current_points, points))
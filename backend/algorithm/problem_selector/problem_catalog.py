@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from uuid import UUID
+
+import numpy as np
+
+from config.settings import Constants
+from courses.models import Problem, Topic, PRACTICE_TYPES
+from .course_cache import CourseCache
+
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+@dataclass
+class ProblemCatalog:
+    """Каталог заданий курса в виде параллельных массивов. Задания не меняются
+    в течение семестра, поэтому каталог строится один раз и позволяет
+    фильтровать кандидатов в памяти без соединений таблиц в запросе.
+
+    main_topics — индекс основной темы каждого задания в topic_ids.
+    sub_topic_bits — матрица принадлежности подтем заданиям, упакованная
+    по битам (строка — задание, бит — тема из topic_ids).
+    topic_bits — то же для всех тем задания (основной темы и подтем).
+    """
+    problem_ids: list[UUID]
+    topic_ids: list[UUID]
+    difficulties: np.ndarray
+    is_practice: np.ndarray
+    times_to_solve: np.ndarray
+    main_topics: np.ndarray
+    sub_topic_bits: np.ndarray
+
+    def __post_init__(self):
+        self.problem_index = {problem_id: i for i, problem_id in enumerate(self.problem_ids)}
+        self.topic_index = {topic_id: i for i, topic_id in enumerate(self.topic_ids)}
+        self.has_sub_topics = self.sub_topic_bits.any(axis=1)
+        main_topics = np.zeros((len(self.problem_ids), len(self.topic_ids)), dtype=bool)
+        main_topics[np.arange(len(self.problem_ids)), self.main_topics] = True
+        self.topic_bits = np.packbits(main_topics, axis=1) | self.sub_topic_bits
+        self.topic_counts = POPCOUNT[self.topic_bits].sum(axis=1)
+
+    def __len__(self):
+        return len(self.problem_ids)
+
+    def topic_mask(self, topic_ids) -> np.ndarray:
+        """Возвращает булев массив по темам каталога, отмечающий темы из topic_ids."""
+        topics = np.zeros(len(self.topic_ids), dtype=bool)
+        topics[[self.topic_index[topic_id] for topic_id in topic_ids if topic_id in self.topic_index]] = True
+        return topics
+
+    def pack_topics(self, topic_ids) -> np.ndarray:
+        """Возвращает упакованную по битам маску тем из topic_ids."""
+        return np.packbits(self.topic_mask(topic_ids))
+
+    def problem_mask(self, problem_ids) -> np.ndarray:
+        """Возвращает булев массив по заданиям каталога, отмечающий задания из problem_ids."""
+        problems = np.zeros(len(self.problem_ids), dtype=bool)
+        problems[[self.problem_index[problem_id] for problem_id in problem_ids
+                  if problem_id in self.problem_index]] = True
+        return problems
+
+    def filter_available(self, answered_problem_ids, topic_ids_with_completed_theory) -> np.ndarray:
+        """Возвращает маску заданий без ответа пользователя, у которых нет подтем
+        или хотя бы по одной подтеме набран минимальный балл по теории.
+        Аналог filter_problems.
+        """
+        completed_topics = self.pack_topics(topic_ids_with_completed_theory)
+        has_completed_sub_topic = (self.sub_topic_bits & completed_topics).any(axis=1)
+        is_available = ~self.has_sub_topics | has_completed_sub_topic
+        return is_available & ~self.problem_mask(answered_problem_ids)
+
+    def filter_similar(self, topic_ids) -> np.ndarray:
+        """Возвращает маску заданий, темы которых (основная тема и подтемы)
+        пересекаются с topic_ids больше чем на PROBLEM_SIMILARITY_PERCENT
+        от большего из множеств тем.
+        """
+        topic_ids = set(topic_ids)
+        intersection = POPCOUNT[self.topic_bits & self.pack_topics(topic_ids)].sum(axis=1)
+        largest_topics_length = np.maximum(self.topic_counts, len(topic_ids))
+        return intersection / largest_topics_length > Constants.PROBLEM_SIMILARITY_PERCENT
+
+    def filter_similar_to_problem(self, problem_id: UUID) -> np.ndarray:
+        """Возвращает маску заданий, схожих с заданием problem_id: с той же
+        основной темой и темами, пересекающимися как в filter_similar.
+        Если задания нет в каталоге, схожих заданий нет.
+        """
+        i = self.problem_index.get(problem_id)
+        if i is None:
+            return np.zeros(len(self.problem_ids), dtype=bool)
+        intersection = POPCOUNT[self.topic_bits & self.topic_bits[i]].sum(axis=1)
+        largest_topics_length = np.maximum(self.topic_counts, self.topic_counts[i])
+        is_similar = intersection / largest_topics_length > Constants.PROBLEM_SIMILARITY_PERCENT
+        return is_similar & (self.main_topics == self.main_topics[i])
+
+    def get_problems(self, mask: np.ndarray) -> list[Problem]:
+        """Возвращает задания, отмеченные в маске, в порядке каталога."""
+        problem_ids = [self.problem_ids[i] for i in np.flatnonzero(mask)]
+        problems = Problem.objects.in_bulk(problem_ids)
+        return [problems[problem_id] for problem_id in problem_ids if problem_id in problems]
+
+
+def build_problem_catalog(course_id: UUID) -> ProblemCatalog:
+    """Строит каталог заданий курса."""
+    topic_ids = list(Topic.objects.filter(module__course_id=course_id).order_by('id').values_list('id', flat=True))
+    topic_index = {topic_id: i for i, topic_id in enumerate(topic_ids)}
+    problems = list(Problem.objects.filter(
+        main_topic__module__course_id=course_id
+    ).order_by('id').values_list('id', 'type', 'difficulty', 'time_to_solve_in_seconds', 'main_topic_id'))
+    problem_index = {problem[0]: i for i, problem in enumerate(problems)}
+    memberships = list(Problem.sub_topics.through.objects.filter(
+        problem__main_topic__module__course_id=course_id
+    ).values_list('problem_id', 'topic_id'))
+    for _, topic_id in memberships:
+        if topic_id not in topic_index:
+            topic_index[topic_id] = len(topic_ids)
+            topic_ids.append(topic_id)
+    sub_topics = np.zeros((len(problems), len(topic_ids)), dtype=bool)
+    for problem_id, topic_id in memberships:
+        sub_topics[problem_index[problem_id], topic_index[topic_id]] = True
+    return ProblemCatalog(
+        problem_ids=[problem[0] for problem in problems],
+        topic_ids=topic_ids,
+        difficulties=np.array([problem[2] for problem in problems], dtype=np.int8),
+        is_practice=np.array([problem[1] in PRACTICE_TYPES for problem in problems], dtype=bool),
+        times_to_solve=np.array([problem[3] for problem in problems], dtype=np.float64),
+        main_topics=np.array([topic_index[problem[4]] for problem in problems], dtype=np.int32),
+        sub_topic_bits=np.packbits(sub_topics, axis=1)
+    )
+
+
+problem_catalogs = CourseCache(build_problem_catalog,
+                               max_size=Constants.COURSE_CACHE_MAX_SIZE,
+                               timeout_seconds=Constants.COURSE_CACHE_TIMEOUT_SECONDS)
+
+
+def get_problem_catalog(course_id: UUID, problem_ids=()) -> ProblemCatalog:
+    """Возвращает каталог заданий курса из кэша. Если в каталоге нет
+    какого-либо из заданий problem_ids (задание добавлено в другом процессе,
+    и кэш этого процесса не сброшен), каталог строится заново.
+    """
+    catalog = problem_catalogs.get(course_id)
+    if any(problem_id not in catalog.problem_index for problem_id in problem_ids):
+        problem_catalogs.invalidate(course_id)
+        catalog = problem_catalogs.get(course_id)
+    return catalog
+
+
+def invalidate_problem_catalog(course_id: UUID = None):
+    """Удаляет каталог заданий курса. Если курс не указан, удаляются все каталоги."""
+    problem_catalogs.invalidate(course_id)
@@ -6,8 +6,9 @@ from algorithm.models import Progress, UserWeakestLinkState, WeakestLinkState
 from config.settings import Constants
 from courses.models import Problem, Semester, Difficulty
 from .points_maximization import get_problems_with_max_value
+from .student_snapshot import StudentSnapshot
 from .utils import (filter_practice_problems, filter_theory_problems,
-                    get_last_theory_user_answers, filter_placement_problems,
+                    filter_placement_problems,
                     filter_theory_problems_increase_difficulty)
 from .weakest_link import next_weakest_link_problem
 from ..utils import truncate_string, format_log_problem
@@ -15,30 +16,38 @@ from ..utils import truncate_string, format_log_problem
 logger = logging.getLogger(__name__)
 
 
-def next_theory_problem(progress: Progress) -> Problem:
-    """Возвращает следующее теоретическое задание по текущей теме студента."""
+def next_theory_problem(progress: Progress, snapshot: StudentSnapshot = None) -> Problem:
+    """Возвращает следующее теоретическое задание по текущей теме студента.
+    Если передан снимок состояния студента, прогресс и ответы берутся из него.
+    """
     if progress.is_theory_completed():
         logger.error(f'( ! ) {progress.user.username:<10} [теория завершена]'
                      f' ({truncate_string(progress.topic.title)})]')
         raise ValueError('Тест по теории завершен.')
-    if progress.topic.parent_topic is not None:
-        if not progress.topic.parent_topic.progress_set.filter(
+    if progress.topic.parent_topic_id is not None:
+        if snapshot is not None:
+            is_parent_topic_theory_low_reached = snapshot.is_parent_topic_theory_low_reached(progress.topic)
+        else:
+            is_parent_topic_theory_low_reached = progress.topic.parent_topic.progress_set.filter(
                 user=progress.user, semester=progress.semester
-        ).first().is_theory_low_reached():
+            ).first().is_theory_low_reached()
+        if not is_parent_topic_theory_low_reached:
             logger.error(f'( ! ) {progress.user.username:<10} [теория по предыдущей теме не завершена]'
                          f' ({truncate_string(progress.topic.parent_topic.title)})]')
             raise ValueError(f'Необходимо завершить тест по теории по теме'
                              f' {progress.topic.parent_topic}.')
-    problems = filter_theory_problems(progress)
-    problems = get_problems_with_max_value(progress.user, progress.semester, problems)
-    last_answers = get_last_theory_user_answers(progress.user, progress.topic)
+    problems = filter_theory_problems(progress, snapshot)
+    answers_count = progress.placement_answers_count
     additional_log_info = ''
-    if len(last_answers) < Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_ANSWERS:
-        additional_log_info = (f' [калибровка ({len(last_answers)}/'
+    if answers_count < Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_ANSWERS:
+        additional_log_info = (f' [калибровка ({answers_count}/'
                                f'{Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_ANSWERS})]')
+        problems = get_problems_with_max_value(progress.user, progress.semester, problems, snapshot)
         problems = filter_placement_problems(progress, problems)
+    else:
+        problems = get_problems_with_max_value(progress.user, progress.semester, problems, snapshot, limit=1)
     if not problems:
-        problems = filter_theory_problems_increase_difficulty(progress)
+        problems = filter_theory_problems_increase_difficulty(progress, snapshot, limit=1)
     if not problems or problems is None:
         logger.error(f'( ! ) {progress.user.username:<10}'
                      f' [доступных теоретических заданий нет]{additional_log_info}')
@@ -47,21 +56,26 @@ def next_theory_problem(progress: Progress) -> Problem:
     return problems[0]
 
 
-def next_practice_problem(user: User, semester: Semester) -> Problem:
-    """Возвращает следующее практическое задание по текущей теме студента."""
-    user_weakest_link_state = UserWeakestLinkState.objects.get(user=user, semester=semester).state
+def next_practice_problem(user: User, semester: Semester, snapshot: StudentSnapshot = None) -> Problem:
+    """Возвращает следующее практическое задание по текущей теме студента.
+    Если передан снимок состояния студента, прогресс и ответы берутся из него.
+    """
+    if snapshot is not None:
+        user_weakest_link_state = snapshot.weakest_link_state
+    else:
+        user_weakest_link_state = UserWeakestLinkState.objects.get(user=user, semester=semester).state
     if user_weakest_link_state == WeakestLinkState.IN_PROGRESS:
-        problem = next_weakest_link_problem(user, semester)
+        problem = next_weakest_link_problem(user, semester, snapshot)
         if problem is not None:
             logger.info(f'(   ) {format_log_problem(user, problem)}'
                         f' [поиск проблемных тем]')
             return problem
-    problems = filter_practice_problems(user, semester)
+    problems = filter_practice_problems(user, semester, snapshot=snapshot)
     if not problems:
-        problems = filter_practice_problems(user, semester, max_difficulty=Difficulty.NORMAL)
+        problems = filter_practice_problems(user, semester, max_difficulty=Difficulty.NORMAL, snapshot=snapshot)
     if not problems:
-        problems = filter_practice_problems(user, semester, max_difficulty=Difficulty.HARD)
-    problems = get_problems_with_max_value(user, semester, problems)
+        problems = filter_practice_problems(user, semester, max_difficulty=Difficulty.HARD, snapshot=snapshot)
+    problems = get_problems_with_max_value(user, semester, problems, snapshot, limit=1)
     if not problems:
         logger.error(f'( ! ) {user.username:<10} [доступных практических заданий нет]')
         raise ValueError('Доступных практических заданий нет.')
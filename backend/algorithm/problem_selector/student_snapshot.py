@@ -0,0 +1,116 @@
+from dataclasses import dataclass, field
+from uuid import UUID
+
+from django.contrib.auth.models import User
+
+from algorithm.models import Progress, UserAnswer, UserWeakestLinkState, WeakestLinkState
+from courses.models import Semester, Topic
+
+
+@dataclass
+class StudentSnapshot:
+    """Состояние студента в семестре, загружаемое один раз за запрос:
+    прогресс по темам, id заданий с ответами и состояние алгоритма поиска
+    слабого звена.
+
+    progresses — прогресс по темам в порядке сортировки Progress (ключ — id темы).
+    """
+    user: User
+    semester: Semester
+    progresses: dict[UUID, Progress] = field(default_factory=dict)
+    answered_problem_ids: set[UUID] = field(default_factory=set)
+    weakest_link_state: str = WeakestLinkState.NONE
+
+    @classmethod
+    def load(cls, user: User, semester: Semester) -> 'StudentSnapshot':
+        """Загружает снимок состояния студента тремя запросами."""
+        snapshot = cls(user=user, semester=semester)
+        snapshot.reload_progresses()
+        snapshot.answered_problem_ids.update(
+            UserAnswer.objects.filter(user=user).values_list('problem_id', flat=True)
+        )
+        snapshot.reload_weakest_link_state()
+        return snapshot
+
+    @classmethod
+    def load_many(cls, users: list[User], semester: Semester) -> dict[int, 'StudentSnapshot']:
+        """Загружает снимки состояния нескольких студентов семестра тремя
+        запросами на всех студентов. Ключ словаря — id пользователя.
+        """
+        snapshots = {user.id: cls(user=user, semester=semester) for user in users}
+        progresses = Progress.objects.filter(user_id__in=list(snapshots), semester=semester)
+        for progress in progresses.select_related('topic'):
+            snapshot = snapshots[progress.user_id]
+            progress.user = snapshot.user
+            progress.semester = semester
+            snapshot.progresses[progress.topic_id] = progress
+        user_answers = UserAnswer.objects.filter(user_id__in=list(snapshots)).values_list('user_id', 'problem_id')
+        for user_id, problem_id in user_answers:
+            snapshots[user_id].answered_problem_ids.add(problem_id)
+        states = UserWeakestLinkState.objects.filter(
+            user_id__in=list(snapshots),
+            semester=semester
+        ).values_list('user_id', 'state')
+        for user_id, state in states:
+            snapshots[user_id].weakest_link_state = state
+        return snapshots
+
+    def reload_progresses(self, topic_ids: list[UUID] = None):
+        """Перезагружает прогресс по всем темам или только по темам topic_ids."""
+        progresses = Progress.objects.filter(user=self.user, semester=self.semester)
+        if topic_ids is not None:
+            progresses = progresses.filter(topic_id__in=topic_ids)
+        for progress in progresses.select_related('topic'):
+            progress.user = self.user
+            progress.semester = self.semester
+            self.progresses[progress.topic_id] = progress
+
+    def reload_weakest_link_state(self):
+        """Перезагружает состояние алгоритма поиска слабого звена."""
+        self.weakest_link_state = UserWeakestLinkState.objects.get(
+            user=self.user,
+            semester=self.semester
+        ).state
+
+    def register_answer(self, user_answer: UserAnswer):
+        """Обновляет снимок после ответа на задание: учитывает ответ и
+        перезагружает прогресс по темам задания.
+        """
+        problem = user_answer.problem
+        self.answered_problem_ids.add(problem.id)
+        topic_ids = [problem.main_topic_id]
+        topic_ids.extend(problem.sub_topics.values_list('id', flat=True))
+        self.reload_progresses(topic_ids)
+
+    def get_progress(self, topic_id: UUID) -> Progress:
+        """Возвращает прогресс по теме."""
+        try:
+            return self.progresses[topic_id]
+        except KeyError:
+            raise Progress.DoesNotExist('Progress matching query does not exist.')
+
+    def get_available_progresses(self) -> list[Progress]:
+        """Возвращает прогрессы по темам, по которым набран минимальный балл
+        по теории и не завершена практика.
+        """
+        return [progress for progress in self.progresses.values()
+                if progress.is_theory_low_reached() and not progress.is_practice_completed()]
+
+    def get_topic_ids_with_completed_theory(self) -> list[UUID]:
+        """Возвращает id тем, по теории которых набран минимальный балл."""
+        return [topic_id for topic_id, progress in self.progresses.items()
+                if progress.is_theory_low_reached()]
+
+    def get_not_completed_topic_ids(self, target_points: float) -> list[UUID]:
+        """Возвращает id тем, по которым не набран требуемый балл."""
+        return [topic_id for topic_id, progress in self.progresses.items()
+                if progress.points < target_points]
+
+    def is_parent_topic_theory_low_reached(self, topic: Topic) -> bool:
+        """Возвращает True, если у темы нет предыдущей темы или по теории
+        предыдущей темы набран минимальный балл.
+        """
+        if topic.parent_topic_id is None:
+            return True
+        progress = self.progresses.get(topic.parent_topic_id)
+        return progress is not None and progress.is_theory_low_reached()
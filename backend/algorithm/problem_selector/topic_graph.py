@@ -1,84 +1,178 @@
-from dataclasses import dataclass, field
-from functools import lru_cache
-from itertools import combinations
+from dataclasses import dataclass
+from uuid import UUID
+
+import numpy as np
 
 from algorithm.models import TopicGraphEdge
+from config.settings import Constants
 from courses.models import Topic, Course
+from .course_cache import CourseCache
 
 
 @dataclass
 class Edge:
-    topic1: Topic
-    topic2: Topic
+    topic1_id: UUID
+    topic2_id: UUID
     weight: float
 
 
 @dataclass
 class TopicGraph:
-    """Граф связей тем для подсчета оптимального разбиения тем на группы."""
+    """Граф связей тем для подсчета оптимального разбиения тем на группы.
+
+    Матрица смежности хранится в формате CSR только для ненулевых связей:
+    связи темы i — столбцы weight_indices[weight_indptr[i]:weight_indptr[i + 1]]
+    с весами weight_data по тем же позициям (вес связи от темы строки
+    к теме столбца). Строка и столбец — позиции тем в topics.
+    topic_index — позиция темы в topics по id темы.
+    Граф без связей допустим: по нему поиск слабого звена не запускается.
+    """
     topics: list[Topic]
     edges: list[Edge]
-    weights: dict = field(default_factory=dict)
 
     def __post_init__(self):
-        self.weights = {topic.title: {} for topic in self.topics}
-        for edge in self.edges:
-            self.weights[edge.topic1.title][edge.topic2.title] = edge.weight
+        self.topics = list(self.topics)
+        self.topic_index = {topic.id: i for i, topic in enumerate(self.topics)}
+        rows = np.array([self.topic_index[edge.topic1_id] for edge in self.edges], dtype=np.int32)
+        columns = np.array([self.topic_index[edge.topic2_id] for edge in self.edges], dtype=np.int32)
+        data = np.array([edge.weight for edge in self.edges], dtype=np.float32)
+        is_stored = (data != 0) & (rows != columns)
+        rows, columns, data = rows[is_stored], columns[is_stored], data[is_stored]
+        order = np.lexsort((columns, rows))
+        self.weight_indices = columns[order]
+        self.weight_data = data[order]
+        self.weight_indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(self.topics)))])
+
+    def is_empty(self) -> bool:
+        """Возвращает True, если в графе нет ненулевых связей тем."""
+        return len(self.weight_data) == 0
 
     def split_topics_in_two_groups(self, topics: set[Topic]) -> tuple[set[Topic], set[Topic]]:
         """Разделяет темы на две группы с максимальной связью
-        между друг другом.
+        между друг другом. Для небольшого количества тем разбиение
+        находится точно, для большего — эвристикой Кернигана — Лина.
         """
         if len(topics) == 1:
             return topics, set()
         if len(topics) == 2:
             return {topics.pop()}, {topics.pop()}
-        group_combinations1, group_combinations2 = get_group_combinations(topics)
-        group_combinations1 = list(group_combinations1)
-        group_combinations2 = list(group_combinations2)
-        max_weight = 0.0
-        final_groups = ()
-        for combination1 in group_combinations1:
-            for combination2 in group_combinations2:
-                if set(combination1 + combination2) != set(topics):
-                    continue
-                weight = self.calc_topic_group_weight(combination1)
-                weight += self.calc_topic_group_weight(combination2)
-                if weight > max_weight:
-                    max_weight = weight
-                    final_groups = set(combination1), set(combination2)
-        return final_groups
+        topics = list(topics)
+        weights = self.get_weight_matrix(topics)
+        if len(topics) <= Constants.WEAKEST_LINK_EXACT_SPLIT_MAX_TOPICS:
+            group = split_in_two_groups_exact(weights)
+        else:
+            group = split_in_two_groups_kernighan_lin(weights)
+        return ({topics[i] for i in np.flatnonzero(group)},
+                {topics[i] for i in np.flatnonzero(~group)})
 
     def calc_topic_group_weight(self, topics: tuple[Topic]) -> float:
-        """Возвращает сумму весов связей тем."""
-        weight = 0.0
-        group_combinations = combinations(topics, 2)
-        for topic1, topic2 in group_combinations:
-            weight += self.weights[topic1.title][topic2.title]
-        return weight
+        """Возвращает сумму весов связей тем (вес пары тем — среднее
+        весов связей в обе стороны).
+        """
+        return float(self.get_weight_matrix(list(topics)).sum() / 2)
 
+    def get_topic_indices(self, topics) -> list[int]:
+        """Возвращает позиции тем в матрице смежности."""
+        return [self.topic_index[topic.id] for topic in topics]
 
-def get_group_combinations(topics: set[Topic]) -> tuple[combinations, combinations]:
-    """Делит темы на две равные группы и возвращает все сочетания тем
-    внутри этих групп.
+    def get_weight_matrix(self, topics: list[Topic]) -> np.ndarray:
+        """Возвращает симметричную матрицу весов связей тем, вес пары тем —
+        среднее весов связей в обе стороны.
+        """
+        indices = self.get_topic_indices(topics)
+        positions = np.full(len(self.topics), -1)
+        positions[indices] = np.arange(len(indices))
+        weights = np.zeros((len(indices), len(indices)))
+        for row, i in enumerate(indices):
+            start, end = self.weight_indptr[i], self.weight_indptr[i + 1]
+            columns = positions[self.weight_indices[start:end]]
+            is_selected = columns >= 0
+            weights[row, columns[is_selected]] = self.weight_data[start:end][is_selected]
+        return (weights + weights.T) / 2
+
+
+def split_in_two_groups_exact(weights: np.ndarray) -> np.ndarray:
+    """Возвращает маску первой группы (n // 2 вершин) разбиения графа
+    с максимальной суммой весов внутри групп. Вес связей внутри каждого
+    подмножества вершин рассчитывается динамическим программированием
+    по битовым маскам, каждое разбиение рассматривается один раз:
+    вторая группа — дополнение первой. При четном n первая группа
+    содержит вершину 0.
     """
-    middle = int(len(topics) / 2)
-    group_size1, group_size2 = middle, len(topics) - middle
-    group_combinations1 = combinations(topics, group_size1)
-    group_combinations2 = combinations(topics, group_size2)
-    return group_combinations1, group_combinations2
+    n = len(weights)
+    inner_weights = np.zeros(1 << n)
+    sizes = np.zeros(1 << n, dtype=np.int8)
+    for bit in range(n):
+        links = np.zeros(1 << bit)
+        for other_bit in range(bit):
+            links[1 << other_bit:1 << (other_bit + 1)] = links[:1 << other_bit] + weights[bit, other_bit]
+        inner_weights[1 << bit:1 << (bit + 1)] = inner_weights[:1 << bit] + links
+        sizes[1 << bit:1 << (bit + 1)] = sizes[:1 << bit] + 1
+    masks = np.flatnonzero(sizes == n // 2)
+    if n % 2 == 0:
+        masks = masks[masks & 1 == 1]
+    complements = ((1 << n) - 1) ^ masks
+    best_mask = masks[np.argmax(inner_weights[masks] + inner_weights[complements])]
+    return (best_mask >> np.arange(n)) & 1 == 1
 
 
-@lru_cache(maxsize=None)
-def load_topic_graph(course: Course) -> TopicGraph:
-    """Создает граф связей тем."""
-    topic_graph_edges = TopicGraphEdge.objects.filter(course=course)
-    if not topic_graph_edges:
-        raise ValueError(f'Отсутствует граф связей тем по курсу {course}')
-    edges = []
-    for edge in topic_graph_edges:
-        edges.append(Edge(topic1=edge.topic1,
-                          topic2=edge.topic2,
-                          weight=edge.weight))
-    topics = Topic.objects.filter(module__course=course)
+def split_in_two_groups_kernighan_lin(weights: np.ndarray) -> np.ndarray:
+    """Возвращает маску первой группы (n // 2 вершин) разбиения графа,
+    найденного эвристикой Кернигана — Лина: группы улучшаются обменом
+    пар вершин, пока обмен увеличивает сумму весов внутри групп.
+    При четном n первая группа содержит вершину 0.
+    """
+    n = len(weights)
+    group = np.zeros(n, dtype=bool)
+    group[:n // 2] = True
+    while True:
+        is_same_group = group[:, np.newaxis] == group[np.newaxis, :]
+        differences = np.where(is_same_group, -weights, weights).sum(axis=1)
+        is_locked = np.zeros(n, dtype=bool)
+        gains = []
+        swaps = []
+        for _ in range(n // 2):
+            first = np.flatnonzero(group & ~is_locked)
+            second = np.flatnonzero(~group & ~is_locked)
+            pair_gains = (differences[first][:, np.newaxis] + differences[second][np.newaxis, :]
+                          - 2 * weights[np.ix_(first, second)])
+            i, j = np.unravel_index(np.argmax(pair_gains), pair_gains.shape)
+            a, b = first[i], second[j]
+            gains.append(pair_gains[i, j])
+            swaps.append((a, b))
+            is_locked[a] = is_locked[b] = True
+            sign = np.where(group, 1, -1)
+            differences += 2 * sign * (weights[:, a] - weights[:, b])
+        total_gains = np.cumsum(gains)
+        best = int(np.argmax(total_gains))
+        if total_gains[best] <= 1e-12:
+            break
+        for a, b in swaps[:best + 1]:
+            group[a], group[b] = False, True
+    if n % 2 == 0 and not group[0]:
+        group = ~group
+    return group
+
+
+def build_topic_graph(course_id: UUID) -> TopicGraph:
+    """Создает граф связей тем. Если ненулевых связей нет, граф пустой."""
+    edges = [Edge(topic1_id, topic2_id, weight) for topic1_id, topic2_id, weight in TopicGraphEdge.objects.filter(
+        course_id=course_id
+    ).exclude(weight=0).values_list('topic1_id', 'topic2_id', 'weight')]
+    topics = Topic.objects.filter(module__course_id=course_id)
     return TopicGraph(topics, edges)
+
+
+topic_graphs = CourseCache(build_topic_graph,
+                           max_size=Constants.COURSE_CACHE_MAX_SIZE,
+                           timeout_seconds=Constants.COURSE_CACHE_TIMEOUT_SECONDS)
+
+
+def load_topic_graph(course: Course) -> TopicGraph:
+    """Возвращает граф связей тем курса из кэша."""
+    return topic_graphs.get(course.id)
+
+
+def invalidate_topic_graph(course_id: UUID = None):
+    """Удаляет граф связей тем курса. Если курс не указан, удаляются графы всех курсов."""
+    topic_graphs.invalidate(course_id)
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from itertools import islice
+from uuid import UUID
+
+import numpy as np
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from algorithm.models import UserAnswer, TopicGraphEdge, TopicGraphLearningState
+from config.settings import Constants
+from courses.models import Topic
+from .problem_catalog import ProblemCatalog, build_problem_catalog
+from .topic_graph import invalidate_topic_graph
+
+
+def learn_topic_graph_weights(course_id: UUID) -> int:
+    """Обновляет веса графа связи тем курса по ответам пользователей,
+    созданным после предыдущего расчета. Учитываются только ответы, созданные
+    раньше TOPIC_GRAPH_LEARNING_LAG_SECONDS до начала расчета: ответ, транзакция
+    которого еще не зафиксирована, будет учтен следующим расчетом, а не пропущен.
+    Каталог заданий строится заново, а не берется из кэша, чтобы ответы
+    на задания, добавленные после построения кэшированного каталога,
+    не были пропущены. Возвращает количество учтенных ответов.
+    """
+    TopicGraphLearningState.objects.get_or_create(course_id=course_id)
+    with transaction.atomic():
+        state = TopicGraphLearningState.objects.select_for_update().get(course_id=course_id)
+        last_answer_created_at = timezone.now() - timedelta(seconds=Constants.TOPIC_GRAPH_LEARNING_LAG_SECONDS)
+        answers = UserAnswer.objects.filter(
+            problem__main_topic__module__course_id=course_id,
+            is_solved__isnull=False,
+            created_at__lte=last_answer_created_at
+        )
+        if state.last_answer_created_at is not None:
+            answers = answers.filter(created_at__gt=state.last_answer_created_at)
+        catalog = build_problem_catalog(course_id)
+        failures, successes = count_answers_by_problem(catalog, answers)
+        topic_ids = set(Topic.objects.filter(module__course_id=course_id).values_list('id', flat=True))
+        update_topic_graph_edges(course_id, [
+            (catalog.topic_ids[topic1], catalog.topic_ids[topic2], co_failure_count, co_success_count)
+            for topic1, topic2, co_failure_count, co_success_count
+            in zip(*count_topic_co_occurrences(catalog, failures, successes))
+            if catalog.topic_ids[topic1] in topic_ids and catalog.topic_ids[topic2] in topic_ids
+        ])
+        if state.last_answer_created_at is None or state.last_answer_created_at < last_answer_created_at:
+            state.last_answer_created_at = last_answer_created_at
+            state.save()
+    invalidate_topic_graph(course_id)
+    return int(failures.sum() + successes.sum())
+
+
+def count_answers_by_problem(catalog: ProblemCatalog,
+                             answers: QuerySet[UserAnswer]) -> tuple[np.ndarray, np.ndarray]:
+    """Возвращает количество неправильных и правильных ответов на каждое
+    задание каталога. Ответы читаются из БД частями, поэтому память
+    не зависит от их количества.
+    """
+    failures = np.zeros(len(catalog), dtype=np.int64)
+    successes = np.zeros(len(catalog), dtype=np.int64)
+    chunk_size = Constants.TOPIC_GRAPH_LEARNING_CHUNK_SIZE
+    rows = answers.values_list('problem_id', 'is_solved').iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        problem_indices = np.array([catalog.problem_index.get(problem_id, -1) for problem_id, _ in chunk])
+        is_solved = np.array([is_solved for _, is_solved in chunk], dtype=bool)
+        is_known = problem_indices >= 0
+        failures += np.bincount(problem_indices[is_known & ~is_solved], minlength=len(catalog))
+        successes += np.bincount(problem_indices[is_known & is_solved], minlength=len(catalog))
+    return failures, successes
+
+
+def count_topic_co_occurrences(catalog: ProblemCatalog, failures: np.ndarray,
+                               successes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Возвращает пары различных тем каталога (индексы в topic_ids) и количество
+    неправильных и правильных ответов на задания, в темы которых (основную
+    и подтемы) входят обе темы пары. Пары перебираются только по заданиям
+    с ответами и их темам, поэтому память пропорциональна количеству
+    найденных пар, а не квадрату количества тем.
+    """
+    answered = np.flatnonzero(failures + successes)
+    topics = np.unpackbits(catalog.topic_bits[answered], axis=1, count=len(catalog.topic_ids))
+    rows, columns = np.nonzero(topics)
+    lengths = np.bincount(rows, minlength=len(answered))
+    starts = np.cumsum(lengths) - lengths
+    pair_lengths = lengths[rows]
+    left = np.repeat(np.arange(len(rows)), pair_lengths)
+    right = starts[rows[left]] + np.arange(len(left)) - np.repeat(np.cumsum(pair_lengths) - pair_lengths,
+                                                                  pair_lengths)
+    is_pair = columns[left] != columns[right]
+    left, right = left[is_pair], right[is_pair]
+    keys, inverse = np.unique(columns[left].astype(np.int64) * len(catalog.topic_ids) + columns[right],
+                              return_inverse=True)
+    co_failures = np.bincount(inverse, weights=failures[answered][rows[left]], minlength=len(keys))
+    co_successes = np.bincount(inverse, weights=successes[answered][rows[left]], minlength=len(keys))
+    return (keys // len(catalog.topic_ids), keys % len(catalog.topic_ids),
+            co_failures.astype(np.int64), co_successes.astype(np.int64))
+
+
+def update_topic_graph_edges(course_id: UUID, co_occurrences: list[tuple[UUID, UUID, int, int]]):
+    """Добавляет количество ответов к граням графа связи тем курса
+    и пересчитывает их веса. co_occurrences — пары тем с количеством
+    неправильных и правильных ответов. Отсутствующие грани, по темам которых
+    есть ответы, создаются; грани без ответов сохраняют прежний вес.
+    """
+    counts = {(topic1_id, topic2_id): (co_failure_count, co_success_count)
+              for topic1_id, topic2_id, co_failure_count, co_success_count
+              in TopicGraphEdge.objects.filter(course_id=course_id).values_list(
+                  'topic1_id', 'topic2_id', 'co_failure_count', 'co_success_count')}
+    updated_edges = []
+    for topic1_id, topic2_id, co_failure_count, co_success_count in co_occurrences:
+        previous_co_failure_count, previous_co_success_count = counts.get((topic1_id, topic2_id), (0, 0))
+        co_failure_count = int(co_failure_count) + previous_co_failure_count
+        co_success_count = int(co_success_count) + previous_co_success_count
+        updated_edges.append(TopicGraphEdge(
+            course_id=course_id,
+            topic1_id=topic1_id,
+            topic2_id=topic2_id,
+            weight=calculate_edge_weight(co_failure_count, co_success_count),
+            co_failure_count=co_failure_count,
+            co_success_count=co_success_count
+        ))
+    TopicGraphEdge.objects.bulk_create(
+        updated_edges,
+        batch_size=Constants.TOPIC_GRAPH_LEARNING_CHUNK_SIZE,
+        update_conflicts=True,
+        unique_fields=['course_id', 'topic1_id', 'topic2_id'],
+        update_fields=['weight', 'co_failure_count', 'co_success_count']
+    )
+
+
+def calculate_edge_weight(co_failure_count: int, co_success_count: int) -> float:
+    """Возвращает вес грани — долю неправильных ответов на задания с обеими
+    темами, сглаженную к нулю при малом количестве ответов.
+    """
+    return co_failure_count / (co_failure_count + co_success_count + Constants.TOPIC_GRAPH_WEIGHT_PRIOR_ANSWERS)
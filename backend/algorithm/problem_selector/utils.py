@@ -1,10 +1,16 @@
+import bisect
 import math
+from functools import lru_cache
+from uuid import UUID
 
+import numpy as np
 from django.contrib.auth.models import User
 from django.db.models import QuerySet, Q, F
 
 from algorithm.models import UserAnswer, Progress
 from algorithm.problem_selector.points_maximization import get_problems_with_max_value
+from algorithm.problem_selector.problem_catalog import get_problem_catalog
+from algorithm.problem_selector.student_snapshot import StudentSnapshot
 from config.settings import Constants
 from courses.models import (Difficulty, THEORY_TYPES, PRACTICE_TYPES, Semester,
                             Problem, Topic)
@@ -16,12 +22,15 @@ DIFFICULTY_COEFFICIENT = {
 }
 
 
-def filter_theory_problems(progress: Progress) -> QuerySet[Problem]:
+def filter_theory_problems(progress: Progress, snapshot: StudentSnapshot = None) -> QuerySet[Problem] | list[Problem]:
     """Возвращает теоретические задания, доступные для текущей темы пользователя
-    упорядоченные в порядке убывания сложности.
+    упорядоченные в порядке убывания сложности. Если передан снимок состояния
+    студента, задания отбираются из каталога заданий курса в памяти.
     """
-    threshold_low = get_theory_threshold_low()
     difficulty = get_suitable_problem_difficulty(progress.skill_level)
+    if snapshot is not None:
+        return filter_theory_problems_from_catalog(progress, snapshot, difficulty)
+    threshold_low = get_theory_threshold_low()
     topics_with_completed_parent_topics = Topic.objects.filter(
         Q(parent_topic__isnull=True)
         | (Q(parent_topic__progress__theory_points__gte=threshold_low)
@@ -37,14 +46,37 @@ def filter_theory_problems(progress: Progress) -> QuerySet[Problem]:
     return problems
 
 
+def filter_theory_problems_from_catalog(progress: Progress, snapshot: StudentSnapshot,
+                                        max_difficulty: Difficulty) -> list[Problem]:
+    """Возвращает теоретические задания по теме прогресса со сложностью
+    не выше max_difficulty, отбирая их из каталога заданий курса в памяти.
+    Доступность темы и задания с ответами определяются по снимку состояния
+    студента, поэтому к Problem выполняется один запрос по первичному ключу.
+    """
+    if not snapshot.is_parent_topic_theory_low_reached(progress.topic):
+        return []
+    catalog = get_problem_catalog(snapshot.semester.course_id)
+    topic_index = catalog.topic_index.get(progress.topic_id)
+    if topic_index is None:
+        return []
+    mask = catalog.filter_available(snapshot.answered_problem_ids,
+                                    snapshot.get_topic_ids_with_completed_theory())
+    mask &= ~catalog.is_practice & (catalog.main_topics == topic_index) & (catalog.difficulties <= max_difficulty)
+    return catalog.get_problems(mask)
+
+
 def filter_practice_problems(user: User, semester: Semester,
-                             max_difficulty: Difficulty = None) -> QuerySet[Problem]:
+                             max_difficulty: Difficulty = None,
+                             snapshot: StudentSnapshot = None) -> QuerySet[Problem] | list[Problem]:
     """Возвращает практические задания, доступные для текущего пользователя
-    упорядоченные в порядке убывания сложности.
+    упорядоченные в порядке убывания сложности. Если передан снимок состояния
+    студента, задания отбираются из каталога заданий курса в памяти.
     """
-    available_progresses = get_available_progresses(user, semester)
+    available_progresses = get_available_progresses(user, semester, snapshot)
     if not available_progresses:
         raise ValueError('Необходимо завершить тест по теории хотя бы по одной теме.')
+    if snapshot is not None:
+        return filter_practice_problems_from_catalog(snapshot, available_progresses, max_difficulty)
     not_completed_topics_ids = Progress.objects.filter(
         user=user,
         semester=semester
@@ -64,10 +96,36 @@ def filter_practice_problems(user: User, semester: Semester,
     return problems
 
 
-def get_available_progresses(user: User, semester: Semester) -> QuerySet[Progress]:
+def filter_practice_problems_from_catalog(snapshot: StudentSnapshot,
+                                          available_progresses: list[Progress],
+                                          max_difficulty: Difficulty = None) -> list[Problem]:
+    """Возвращает практические задания, доступные для текущего пользователя,
+    отбирая их из каталога заданий курса в памяти. Аналог filter_practice_problems.
+    """
+    catalog = get_problem_catalog(snapshot.semester.course_id)
+    target_points = snapshot.user.usertargetpoints.target_points
+    not_completed_topics = catalog.topic_mask(snapshot.get_not_completed_topic_ids(target_points))
+    mask = catalog.filter_available(snapshot.answered_problem_ids,
+                                    snapshot.get_topic_ids_with_completed_theory())
+    mask &= catalog.is_practice & not_completed_topics[catalog.main_topics]
+    if max_difficulty is None:
+        progresses = [progress for progress in available_progresses if progress.topic_id in catalog.topic_index]
+        max_difficulties = np.zeros(len(catalog.topic_ids), dtype=np.int8)
+        max_difficulties[[catalog.topic_index[progress.topic_id] for progress in progresses]] = \
+            get_suitable_problem_difficulties([progress.skill_level for progress in progresses])
+        mask &= catalog.difficulties <= max_difficulties[catalog.main_topics]
+    else:
+        mask &= catalog.difficulties <= max_difficulty
+    return catalog.get_problems(mask)
+
+
+def get_available_progresses(user: User, semester: Semester,
+                             snapshot: StudentSnapshot = None) -> QuerySet[Progress] | list[Progress]:
     """Возвращает прогрессы по темам, по которым набран минимальный балл
     по теории и не завершена практика.
     """
+    if snapshot is not None:
+        return snapshot.get_available_progresses()
     return Progress.objects.filter(
         user=user,
         theory_points__gte=get_theory_threshold_low(),
@@ -92,17 +150,26 @@ def filter_problems(user: User, semester: Semester) -> QuerySet[Problem]:
 
 
 def filter_problems_with_suitable_difficulty(problems: QuerySet[Problem],
-                                             available_progresses: QuerySet[Progress]) -> QuerySet[Problem]:
+                                             available_progresses: QuerySet[Progress] | list[Progress]
+                                             ) -> QuerySet[Problem]:
     """Возвращает задания с подходящим уровнем сложности по каждой теме."""
-    appropriate_problem_ids = []
-    for problem in problems:
-        progress = available_progresses.filter(topic=problem.main_topic).first()
-        if progress is None:
-            continue
-        difficulty = get_suitable_problem_difficulty(progress.skill_level)
-        if problem.difficulty <= difficulty.value:
-            appropriate_problem_ids.append(problem.id)
-    return Problem.objects.filter(id__in=appropriate_problem_ids)
+    topic_ids_by_difficulty = {}
+    for topic_id, difficulty in get_suitable_difficulty_by_topic(available_progresses).items():
+        topic_ids_by_difficulty.setdefault(difficulty, []).append(topic_id)
+    if not topic_ids_by_difficulty:
+        return problems.none()
+    suitable_difficulty = Q()
+    for difficulty, topic_ids in topic_ids_by_difficulty.items():
+        suitable_difficulty |= Q(main_topic_id__in=topic_ids, difficulty__lte=difficulty)
+    return problems.filter(suitable_difficulty)
+
+
+def get_suitable_difficulty_by_topic(progresses: QuerySet[Progress] | list[Progress]) -> dict[UUID, Difficulty]:
+    """Возвращает подходящий по уровню знаний студента уровень сложности
+    заданий по каждой теме.
+    """
+    return {progress.topic_id: get_suitable_problem_difficulty(progress.skill_level)
+            for progress in progresses}
 
 
 def get_theory_threshold_low() -> float:
@@ -116,12 +183,57 @@ def get_theory_threshold_low() -> float:
 
 def get_suitable_problem_difficulty(skill_level: float) -> Difficulty:
     """Возвращает уровень сложности задания, подходящий по уровню знаний студента."""
-    probability = Constants.ALGORITHM_SUITABLE_DIFFICULTY_PROBABILITY
-    if correct_answer_probability(skill_level, Difficulty.HARD) >= probability:
-        return Difficulty.HARD
-    if correct_answer_probability(skill_level, Difficulty.NORMAL) >= probability:
-        return Difficulty.NORMAL
-    return Difficulty.EASY
+    breakpoints = get_suitable_difficulty_breakpoints()
+    return Difficulty(Difficulty.EASY + bisect.bisect_right(breakpoints, skill_level))
+
+
+def get_suitable_problem_difficulties(skill_levels) -> np.ndarray:
+    """Возвращает массив уровней сложности заданий, подходящих по уровням
+    знаний skill_levels. Векторный аналог get_suitable_problem_difficulty.
+    """
+    breakpoints = get_suitable_difficulty_breakpoints()
+    skill_levels = np.asarray(skill_levels, dtype=np.float64)
+    return (Difficulty.EASY + np.searchsorted(breakpoints, skill_levels, side='right')).astype(np.int8)
+
+
+def get_suitable_difficulty_breakpoints() -> tuple[float, float]:
+    """Возвращает минимальные уровни знаний, начиная с которых подходят
+    задания нормальной и высокой сложности, для текущих значений Constants.
+    """
+    return calculate_suitable_difficulty_breakpoints(
+        Constants.ALGORITHM_SUITABLE_DIFFICULTY_PROBABILITY,
+        Constants.ALGORITHM_DIFFICULTY_COEFFICIENT_NORMAL,
+        Constants.ALGORITHM_DIFFICULTY_COEFFICIENT_HARD
+    )
+
+
+@lru_cache
+def calculate_suitable_difficulty_breakpoints(probability: float, normal_coefficient: float,
+                                              hard_coefficient: float) -> tuple[float, float]:
+    """Рассчитывает минимальные уровни знаний, при которых вероятность
+    правильного ответа на задание нормальной и высокой сложности не ниже
+    probability. Границы совпадают с прямым расчетом вероятности
+    с точностью до числа с плавающей точкой.
+    """
+    hard = find_probability_breakpoint(probability, hard_coefficient)
+    normal = min(find_probability_breakpoint(probability, normal_coefficient), hard)
+    return normal, hard
+
+
+def find_probability_breakpoint(probability: float, coefficient: float) -> float:
+    """Возвращает наименьший уровень знаний, при котором вероятность
+    правильного ответа на задание с коэффициентом сложности coefficient
+    не ниже probability.
+    """
+    def is_reached(skill_level: float) -> bool:
+        return 1 / (1 + math.exp(-(skill_level - coefficient))) >= probability
+
+    skill_level = coefficient + math.log(probability / (1 - probability))
+    while not is_reached(skill_level):
+        skill_level = math.nextafter(skill_level, math.inf)
+    while is_reached(math.nextafter(skill_level, -math.inf)):
+        skill_level = math.nextafter(skill_level, -math.inf)
+    return skill_level
 
 
 def correct_answer_probability(skill_level: float, difficulty: Difficulty) -> float:
@@ -141,16 +253,6 @@ def get_last_practice_user_answers(user: User, semester: Semester) -> QuerySet[U
     ).order_by('-created_at')
 
 
-def get_last_theory_user_answers(user: User, topic: Topic) -> QuerySet[UserAnswer]:
-    """Возвращает теоретические задания по теме, решенные пользователем."""
-    return UserAnswer.objects.filter(
-        user=user,
-        problem__main_topic=topic,
-        problem__type__in=THEORY_TYPES,
-        is_solved__isnull=False
-    ).order_by('-created_at')
-
-
 def filter_wrongly_answered_theory_problems(progress: Progress) -> QuerySet[Problem]:
     """Возвращает неправильно решенные задания по теме."""
     difficulty = get_suitable_problem_difficulty(progress.skill_level)
@@ -173,19 +275,25 @@ def filter_placement_problems(progress: Progress, problems: list[Problem]) -> li
     return problems
 
 
-def filter_theory_problems_increase_difficulty(progress: Progress) -> list[Problem] | None:
+def filter_theory_problems_increase_difficulty(progress: Progress,
+                                               snapshot: StudentSnapshot = None,
+                                               limit: int = None) -> list[Problem] | None:
     """Повышает сложность теоретических заданий на один уровень,
-    и возвращает список заданий со сложностью равной ей или ниже.
+    и возвращает список заданий со сложностью равной ей или ниже
+    (не более limit самых ценных, если limit указан).
     Возвращает None, если превышена максимальная сложность.
     """
     try:
         difficulty = Difficulty(get_suitable_problem_difficulty(progress.skill_level).value + 1)
     except ValueError:
         return None
-    problems = filter_problems(progress.user, progress.semester).filter(
-        main_topic=progress.topic,
-        type__in=THEORY_TYPES,
-        difficulty__lte=difficulty
-    )
-    problems = get_problems_with_max_value(progress.user, progress.semester, problems)
+    if snapshot is not None:
+        problems = filter_theory_problems_from_catalog(progress, snapshot, difficulty)
+    else:
+        problems = filter_problems(progress.user, progress.semester).filter(
+            main_topic=progress.topic,
+            type__in=THEORY_TYPES,
+            difficulty__lte=difficulty
+        )
+    problems = get_problems_with_max_value(progress.user, progress.semester, problems, snapshot, limit)
     return problems
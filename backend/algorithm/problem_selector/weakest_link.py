@@ -1,16 +1,21 @@
 import logging
 from collections import Counter
+from copy import deepcopy
+from typing import Callable, TypeVar
 from uuid import UUID
 
+import numpy as np
 from django.contrib.auth.models import User
-from django.db import transaction
-from django.db.models import QuerySet, Count
+from django.db import transaction, DatabaseError
+from django.db.models import QuerySet, F
 
-from algorithm.models import (UserAnswer, WeakestLinkProblem, UserWeakestLinkState,
-                              WeakestLinkState, WeakestLinkTopic, Progress)
+from algorithm.models import UserAnswer, UserWeakestLinkState, WeakestLinkState, Progress
 from algorithm.problem_selector.points_maximization import get_problems_with_max_value
+from algorithm.problem_selector.problem_catalog import get_problem_catalog
+from algorithm.problem_selector.student_snapshot import StudentSnapshot
 from algorithm.problem_selector.topic_graph import load_topic_graph
 from algorithm.problem_selector.utils import get_last_practice_user_answers, filter_practice_problems
+from algorithm.utils import bump_progress_version
 from config.settings import Constants
 from courses.models import Problem, Topic, Semester, Difficulty, PRACTICE_TYPES
 
@@ -22,6 +27,8 @@ DIFFICULTY_COEFFICIENT = {
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
 
 def start_weakest_link_when_ready(user: User, semester: Semester) -> Problem | None:
     """Заполняет очередь слабого звена, если выполнено условие
@@ -54,64 +61,39 @@ def get_practice_problems_for_weakest_link(user: User, semester: Semester,
     пользователь допустил ошибку в двух похожих заданиях и не исправил ее
     (для исправления нужно правильно решить два похожих задания после
     допущенной ошибки), возвращает эти два практических задания. Если ошибка
-    исправлена, возвращает None.
+    исправлена, возвращает None. История ответов читается одним запросом,
+    сходство заданий проверяется по каталогу заданий курса.
     """
     main_topic_answers = UserAnswer.objects.filter(
         user=user,
         problem__main_topic=problem.main_topic,
         semester=semester,
         problem__type__in=PRACTICE_TYPES
-    ).order_by('-created_at').exclude(problem=problem)
-    not_answered_problem_ids = get_not_answered_problem_ids(main_topic_answers)
-    main_topic_answers = main_topic_answers.exclude(problem__id__in=not_answered_problem_ids)
-    checked_problems = []
+    ).order_by('-created_at').exclude(problem=problem).values_list('problem_id', 'is_solved')
+    main_topic_answers = list(main_topic_answers)
+    failed_attempts = Counter(problem_id for problem_id, is_solved in main_topic_answers if is_solved is False)
+    catalog = get_problem_catalog(semester.course_id,
+                                  [problem.id, *(problem_id for problem_id, _ in main_topic_answers)])
+    is_similar = catalog.filter_similar_to_problem(problem.id)
+    checked_problem_ids = set()
     number_of_solved_similar_problems = 0
-    for answer in main_topic_answers:
-        if problem == answer.problem:
+    for problem_id, is_solved in main_topic_answers:
+        if 0 < failed_attempts[problem_id] < Constants.MAX_NUMBER_OF_ATTEMPTS_PER_PRACTICE_PROBLEM:
+            continue
+        if (problem_id in checked_problem_ids or problem_id not in catalog.problem_index
+                or not is_similar[catalog.problem_index[problem_id]]):
             continue
-        if is_problems_similar(problem, answer.problem):
-            if answer.problem in checked_problems:
-                continue
-            checked_problems.append(answer.problem)
-            if answer.is_solved is None:
-                return None
-            if not answer.is_solved:
-                return problem, answer.problem
-            number_of_solved_similar_problems += 1
-            if number_of_solved_similar_problems == 2:
-                return None
+        checked_problem_ids.add(problem_id)
+        if is_solved is None:
+            return None
+        if not is_solved:
+            return problem, Problem.objects.get(pk=problem_id)
+        number_of_solved_similar_problems += 1
+        if number_of_solved_similar_problems == 2:
+            return None
     return None
 
 
-def get_not_answered_problem_ids(user_answers: QuerySet[UserAnswer]) -> list[UUID]:
-    """Возвращает id заданий, у которых не исчерпан лимит попыток."""
-    problems = user_answers.filter(is_solved=False).values_list('problem', flat=True)
-    counter = Counter(problems)
-    not_answered_problem_ids = [value for value, count in counter.items()
-                                if count < Constants.MAX_NUMBER_OF_ATTEMPTS_PER_PRACTICE_PROBLEM]
-    return not_answered_problem_ids
-
-
-def is_problems_similar(problem1: Problem, problem2: Problem) -> bool:
-    """Сравнивает два задания на сходство. Схожими считаются задания
-    с одной и той же основной темой и подтемами, пересекающимися на 66%.
-    """
-    if problem1.main_topic != problem2.main_topic:
-        return False
-    topics1 = get_topics_of_problems(problem1)
-    topics2 = get_topics_of_problems(problem2)
-    return is_topics_similar(topics1, topics2)
-
-
-def is_topics_similar(topics1: set[Topic], topics2: set[Topic]) -> bool:
-    """Сравнивает два множества тем на сходство. Схожими считаются множества,
-    в которых темы пересекаются на 66% и более.
-    """
-    intersection = topics1.intersection(topics2)
-    largest_topics_length = max(len(topics1), len(topics2))
-    return len(intersection) / largest_topics_length > Constants.PROBLEM_SIMILARITY_PERCENT
-
-
 def remove_completed_topics(user: User, semester: Semester, topics: set[Topic]) -> QuerySet[Topic]:
     """Удаляет из списка темы, по практике которых набран максимальный балл."""
     progresses = Progress.objects.filter(
@@ -127,47 +109,44 @@ def remove_completed_topics(user: User, semester: Semester, topics: set[Topic])
 def fill_weakest_link_queue(user: User, semester: Semester,
                             topics: set[Topic], max_difficulty: Difficulty):
     """Находит похожие задания с темами неправильно решенных заданий
-    problem1 и problem2, после чего помещает их в очередь слабого звена
-    WeakestLinkProblem.
+    problem1 и problem2, после чего помещает их в очередь слабого звена.
+    Если параллельный запрос уже запустил поиск слабого звена, очередь
+    не изменяется.
     """
     topic_graph = load_topic_graph(semester.course)
+    if topic_graph.is_empty():
+        logger.error(f'( ! ) {user.username:<10} [поиск проблемных тем]'
+                     f' граф связей тем курса пуст.')
+        return
     topic_groups = topic_graph.split_topics_in_two_groups(topics)
     problems = filter_practice_problems(user, semester, max_difficulty)
-    final_topic_groups = []
+    queue_problems = []
+    queue_topics = []
     for group_number, topic_group in enumerate(topic_groups, start=1):
-        group_problems = find_problems_with_topics(topic_group, problems)
-        group_problems = get_problems_with_max_value(user, semester, group_problems)
-        weakest_link_problems = group_problems[:Constants.WEAKEST_LINK_MAX_PROBLEMS_PER_GROUP]
+        group_problems = find_problems_with_topics(topic_group, problems, semester.course_id)
+        weakest_link_problems = get_problems_with_max_value(user, semester, group_problems,
+                                                            limit=Constants.WEAKEST_LINK_MAX_PROBLEMS_PER_GROUP)
         if len(weakest_link_problems) < Constants.WEAKEST_LINK_MAX_PROBLEMS_PER_GROUP:
             continue
-        for problem in weakest_link_problems:
-            WeakestLinkProblem.objects.create(user=user, group_number=group_number,
-                                              semester=semester, problem=problem)
-        final_topic_groups.append((group_number, topic_group))
-    if final_topic_groups:
-        add_topics_to_weakest_link_queue(user, semester, final_topic_groups)
-        update_user_weakest_link_state(user, semester, WeakestLinkState.IN_PROGRESS)
-        logger.info(f'(   ) {user.username:<10} [поиск проблемных тем]'
-                    f' создано групп: {len(final_topic_groups)}')
-    else:
+        queue_problems.extend({'problem': str(problem.id), 'group_number': group_number, 'is_solved': None}
+                              for problem in weakest_link_problems)
+        queue_topics.extend({'topic': str(topic.id), 'group_number': group_number}
+                            for topic in topic_group)
+    if not queue_topics:
         logger.error(f'( ! ) {user.username:<10} [поиск проблемных тем]'
                      f' задания с темами групп не найдены.')
+        return
 
+    def start_weakest_link(user_weakest_link_state: UserWeakestLinkState):
+        if user_weakest_link_state.state != WeakestLinkState.NONE:
+            return
+        user_weakest_link_state.problems = queue_problems
+        user_weakest_link_state.topics = queue_topics
+        user_weakest_link_state.state = WeakestLinkState.IN_PROGRESS
 
-def add_topics_to_weakest_link_queue(user: User, semester: Semester,
-                                     topic_groups: list[tuple[int, set[Topic]]]):
-    """Добавляет потенциально проблемные темы в очередь слабого звена.
-
-    topic_groups — список кортежей из номера группы и списка тем этой группы.
-    """
-    for group_number, topic_group in topic_groups:
-        for topic in topic_group:
-            WeakestLinkTopic.objects.create(
-                user=user,
-                semester=semester,
-                topic=topic,
-                group_number=group_number
-            )
+    change_weakest_link_state(user, semester, start_weakest_link)
+    logger.info(f'(   ) {user.username:<10} [поиск проблемных тем]'
+                f' создано групп: {len({topic["group_number"] for topic in queue_topics})}')
 
 
 def get_topics_of_problems(*args: Problem) -> set[Topic]:
@@ -179,70 +158,135 @@ def get_topics_of_problems(*args: Problem) -> set[Topic]:
     return set(topics)
 
 
-def find_problems_with_topics(topics: set[Topic],
-                              problems: QuerySet[Problem]) -> QuerySet[Problem]:
+def find_problems_with_topics(topics: set[Topic], problems: QuerySet[Problem] | list[Problem],
+                              course_id: UUID) -> QuerySet[Problem]:
     """Возвращает QuerySet с заданиями, у которых основная тема и подтемы
     находятся в topics. Задания упорядочены в порядке убывания сложности.
+    Сходство тем проверяется по каталогу заданий курса для всех заданий сразу.
 
     problems — доступные для пользователя задания.
     """
-    filtered_problem_ids = []
-    for problem in problems:
-        problem_topics = get_topics_of_problems(problem)
-        if is_topics_similar(topics, problem_topics):
-            filtered_problem_ids.append(problem.id)
+    if isinstance(problems, QuerySet):
+        problem_ids = list(problems.values_list('id', flat=True))
+    else:
+        problem_ids = [problem.id for problem in problems]
+    catalog = get_problem_catalog(course_id, problem_ids)
+    mask = catalog.problem_mask(problem_ids) & catalog.filter_similar(topic.id for topic in topics)
+    filtered_problem_ids = [catalog.problem_ids[i] for i in np.flatnonzero(mask)]
     return Problem.objects.filter(id__in=filtered_problem_ids)
 
 
-def change_weakest_link_problem_is_solved(user: User, semester: Semester, problem: Problem,
-                                          is_solved: bool):
-    """Изменяет флаг правильности ответа пользователя у задания из очереди слабого звена."""
-    problem = WeakestLinkProblem.objects.get(user=user, semester=semester, problem=problem)
-    problem.is_solved = is_solved
-    problem.save()
+def change_weakest_link_state(user: User, semester: Semester,
+                              change: Callable[[UserWeakestLinkState], T],
+                              after_save: Callable[[T], None] = None) -> T:
+    """Загружает состояние алгоритма поиска слабого звена, применяет к нему
+    change и, если состояние или очередь изменились, сохраняет их одним
+    UPDATE с проверкой версии. Если строку успел изменить параллельный
+    запрос, change повторяется на заново загруженном состоянии.
+    after_save вызывается с результатом change в одной транзакции с UPDATE
+    и только если состояние сохранено, поэтому не теряется и не повторяется.
+    Возвращает результат change.
+    """
+    for _ in range(Constants.WEAKEST_LINK_STATE_UPDATE_ATTEMPTS):
+        user_weakest_link_state = UserWeakestLinkState.objects.get(user=user, semester=semester)
+        state = user_weakest_link_state.state
+        queue = deepcopy((user_weakest_link_state.problems, user_weakest_link_state.topics))
+        result = change(user_weakest_link_state)
+        if (user_weakest_link_state.state == state
+                and (user_weakest_link_state.problems, user_weakest_link_state.topics) == queue):
+            return result
+        with transaction.atomic():
+            if save_weakest_link_state(user_weakest_link_state):
+                if user_weakest_link_state.state != state:
+                    bump_progress_version(user.id, semester.id)
+                if after_save is not None:
+                    after_save(result)
+                return result
+    raise DatabaseError('Состояние алгоритма поиска слабого звена изменено параллельным запросом.')
+
+
+def lock_weakest_link_state(user: User, semester: Semester):
+    """Блокирует строку состояния алгоритма поиска слабого звена до конца
+    транзакции. Блокируется первой при обработке ответа, поэтому ответы
+    одного студента захватывают строки в одном и том же порядке.
+    """
+    list(UserWeakestLinkState.objects.select_for_update().filter(
+        user=user,
+        semester=semester
+    ).values_list('pk', flat=True))
+
+
+def save_weakest_link_state(user_weakest_link_state: UserWeakestLinkState) -> bool:
+    """Сохраняет состояние алгоритма поиска слабого звена, если его версия
+    не изменилась с момента загрузки. Возвращает True, если состояние сохранено.
+    """
+    is_saved = UserWeakestLinkState.objects.filter(
+        pk=user_weakest_link_state.pk,
+        version=user_weakest_link_state.version
+    ).update(
+        state=user_weakest_link_state.state,
+        problems=user_weakest_link_state.problems,
+        topics=user_weakest_link_state.topics,
+        version=F('version') + 1
+    ) == 1
+    if is_saved:
+        user_weakest_link_state.version += 1
+    return is_saved
+
+
+def get_weakest_link_problem(user_weakest_link_state: UserWeakestLinkState, problem_id: UUID) -> dict | None:
+    """Возвращает запись очереди слабого звена по id задания или None,
+    если задания в очереди нет. Задания в очереди не повторяются.
+    """
+    problem_id = str(problem_id)
+    return next((problem for problem in user_weakest_link_state.problems if problem['problem'] == problem_id), None)
 
 
-def update_user_weakest_link_state(user: User, semester: Semester, state: WeakestLinkState):
-    """Обновляет состояние алгоритма поиска слабого звена."""
-    user_weakest_link_state = UserWeakestLinkState.objects.get(user=user, semester=semester)
-    user_weakest_link_state.state = state
-    user_weakest_link_state.save()
+def clear_weakest_link_queue(user_weakest_link_state: UserWeakestLinkState):
+    """Удаляет все темы и задания из очереди слабого звена и меняет статус алгоритма на None."""
+    user_weakest_link_state.problems = []
+    user_weakest_link_state.topics = []
+    user_weakest_link_state.state = WeakestLinkState.NONE
 
 
-def delete_group_topics_and_problems_when_completed(user: User, semester: Semester):
+def delete_group_topics_and_problems_when_completed(user_weakest_link_state: UserWeakestLinkState):
     """Удаляет из очереди слабого звена задания и темы группы, если в ней
-    достигнуто максимальное количество правильно решенных заданий.
+    достигнуто максимальное количество правильно решенных заданий. Если
+    достигнуто максимальное количество неправильно решенных заданий,
+    удаляются только задания группы.
     """
-    problems = WeakestLinkProblem.objects.filter(user=user, semester=semester)
-    group_numbers = problems.values_list('group_number', flat=True).distinct()
-    for group_number in group_numbers:
-        if is_topic_group_completed(user, semester, group_number, is_successful=True):
-            delete_group_topics_and_problems(user, semester, group_number)
-        elif is_topic_group_completed(user, semester, group_number, is_successful=False):
-            WeakestLinkProblem.objects.filter(user=user, semester=semester,
-                                              group_number=group_number).delete()
-
-
-def delete_group_topics_and_problems(user: User, semester: Semester, group_number: int):
+    successful_group_numbers, failed_group_numbers = get_completed_group_numbers(user_weakest_link_state)
+    user_weakest_link_state.problems = [
+        problem for problem in user_weakest_link_state.problems
+        if problem['group_number'] not in successful_group_numbers | failed_group_numbers
+    ]
+    user_weakest_link_state.topics = [
+        topic for topic in user_weakest_link_state.topics
+        if topic['group_number'] not in successful_group_numbers
+    ]
+
+
+def delete_group_topics_and_problems(user_weakest_link_state: UserWeakestLinkState, group_number: int):
     """Удаляет темы и задания из очереди слабого звена по номеру группы."""
-    WeakestLinkProblem.objects.filter(user=user, semester=semester,
-                                      group_number=group_number).delete()
-    WeakestLinkTopic.objects.filter(user=user, semester=semester,
-                                    group_number=group_number).delete()
+    user_weakest_link_state.problems = [problem for problem in user_weakest_link_state.problems
+                                        if problem['group_number'] != group_number]
+    user_weakest_link_state.topics = [topic for topic in user_weakest_link_state.topics
+                                      if topic['group_number'] != group_number]
 
 
-def is_topic_group_completed(user: User, semester: Semester, group_number: int,
-                             is_successful: bool) -> bool:
-    """Возвращает True, если в группе достигнуто максимальное количество
-    правильно/неправильно решенных заданий.
+def get_completed_group_numbers(user_weakest_link_state: UserWeakestLinkState) -> tuple[set[int], set[int]]:
+    """Возвращает номера групп, в которых достигнуто максимальное количество
+    правильно решенных заданий, и номера групп, в которых достигнуто
+    максимальное количество неправильно решенных заданий.
     """
-    solved_problems = WeakestLinkProblem.objects.filter(
-        user=user,
-        semester=semester,
-        group_number=group_number,
-        is_solved=is_successful
-    )
-    return len(solved_problems) == Constants.WEAKEST_LINK_NUMBER_OF_PROBLEMS_TO_SOLVE
+    counts = Counter((problem['group_number'], problem['is_solved'])
+                     for problem in user_weakest_link_state.problems)
+    group_numbers = {problem['group_number'] for problem in user_weakest_link_state.problems}
+    successful_group_numbers = {group_number for group_number in group_numbers
+                                if counts[(group_number, True)] == Constants.WEAKEST_LINK_NUMBER_OF_PROBLEMS_TO_SOLVE}
+    failed_group_numbers = {group_number for group_number in group_numbers - successful_group_numbers
+                            if counts[(group_number, False)] == Constants.WEAKEST_LINK_NUMBER_OF_PROBLEMS_TO_SOLVE}
+    return successful_group_numbers, failed_group_numbers
 
 
 def check_weakest_link(user: User, semester: Semester, problem: Problem, is_solved: bool) -> bool:
@@ -250,94 +294,108 @@ def check_weakest_link(user: User, semester: Semester, problem: Problem, is_solv
     соответствующие каждому статусу. Возвращает True, когда алгоритм заканчивается,
     в противном случае False.
     """
-    user_weakest_link_state = UserWeakestLinkState.objects.get(user=user, semester=semester)
-    if user_weakest_link_state.state == WeakestLinkState.IN_PROGRESS:
-        if problem not in WeakestLinkProblem.objects.filter(user=user, semester=semester):
-            return False
-        weakest_link_in_progress(user, semester, problem, is_solved)
-    user_weakest_link_state.refresh_from_db()
-    if user_weakest_link_state.state == WeakestLinkState.DONE:
-        if problem not in WeakestLinkProblem.objects.filter(user=user, semester=semester):
-            return False
-        weakest_link_done(user, semester)
-        return True
-    return False
-
-
-def weakest_link_in_progress(user: User, semester: Semester, problem: Problem, is_solved: bool):
-    """Устанавливает ответ пользователя на задание в очереди слабого звена,
+    def check(user_weakest_link_state: UserWeakestLinkState) -> tuple[bool, list[str]]:
+        if user_weakest_link_state.state == WeakestLinkState.IN_PROGRESS:
+            weakest_link_problem = get_weakest_link_problem(user_weakest_link_state, problem.id)
+            if weakest_link_problem is None:
+                return False, []
+            weakest_link_in_progress(user_weakest_link_state, weakest_link_problem, is_solved)
+        if user_weakest_link_state.state == WeakestLinkState.DONE:
+            return True, weakest_link_done(user_weakest_link_state)
+        return False, []
+
+    is_done, _ = change_weakest_link_state(
+        user, semester, check,
+        lambda result: decrease_user_skill_level_after_weakest_link(user, semester, result[1])
+    )
+    return is_done
+
+
+def weakest_link_in_progress(user_weakest_link_state: UserWeakestLinkState,
+                             weakest_link_problem: dict, is_solved: bool):
+    """Устанавливает ответ пользователя на задание из очереди слабого звена,
     удаляет завершенные группы и меняет статус алгоритма, если он завершен.
     """
-    change_weakest_link_problem_is_solved(user, semester, problem, is_solved)
-    delete_group_topics_and_problems_when_completed(user, semester)
-    problems = WeakestLinkProblem.objects.filter(user=user, semester=semester, is_solved__isnull=True)
-    if not problems:
-        update_user_weakest_link_state(user, semester, WeakestLinkState.DONE)
+    weakest_link_problem['is_solved'] = is_solved
+    delete_group_topics_and_problems_when_completed(user_weakest_link_state)
+    if all(problem['is_solved'] is not None for problem in user_weakest_link_state.problems):
+        user_weakest_link_state.state = WeakestLinkState.DONE
 
 
-def weakest_link_done(user: User, semester: Semester):
-    """Понижает уровень знаний по проблемным темам, определенным поиском слабого звена,
-    удаляет темы из очереди и меняет статус алгоритма на None.
+def weakest_link_done(user_weakest_link_state: UserWeakestLinkState) -> list[str]:
+    """Очищает очередь слабого звена и меняет статус алгоритма на None.
+    Возвращает id проблемных тем, уровень знаний по которым понижается
+    при сохранении состояния.
     """
-    topics = WeakestLinkTopic.objects.filter(user=user, semester=semester).values_list('topic', flat=True)
-    decrease_user_skill_level_after_weakest_link(user, semester, topics)
-    WeakestLinkTopic.objects.filter(user=user, semester=semester, topic__in=topics).delete()
-    update_user_weakest_link_state(user, semester, WeakestLinkState.NONE)
+    topic_ids = [topic['topic'] for topic in user_weakest_link_state.topics]
+    clear_weakest_link_queue(user_weakest_link_state)
+    return topic_ids
 
 
-def decrease_user_skill_level_after_weakest_link(user: User, semester: Semester, topics: list[Topic]):
+def decrease_user_skill_level_after_weakest_link(user: User, semester: Semester, topic_ids: list[str]):
     """Понижает уровень знаний по проблемным темам, определенным поиском слабого звена."""
-    for topic in topics:
-        progress = Progress.objects.get(user=user, semester=semester, topic=topic)
-        progress.skill_level -= Constants.WEAKEST_LINK_PENALTY
-        progress.save()
+    Progress.objects.filter(user=user, semester=semester, topic__in=topic_ids).update(
+        skill_level=F('skill_level') - Constants.WEAKEST_LINK_PENALTY
+    )
 
 
 def stop_weakest_link_when_practice_completed(user: User, semester: Semester):
     """Проверяет, завершены ли темы в списке проблемных тем. Если хотя бы
     по одной теме завершена практика, алгоритм поиска слабого звена прерывается.
     """
-    user_weakest_link_state = UserWeakestLinkState.objects.get(user=user, semester=semester)
-    if user_weakest_link_state.state == WeakestLinkState.IN_PROGRESS:
-        weakest_link_topics = WeakestLinkTopic.objects.filter(user=user, semester=semester)
+    def stop(user_weakest_link_state: UserWeakestLinkState):
+        if user_weakest_link_state.state != WeakestLinkState.IN_PROGRESS:
+            return
         progresses = Progress.objects.filter(
             user=user,
             semester=semester,
-            topic__in=weakest_link_topics.values_list('topic', flat=True)
+            topic__in=[topic['topic'] for topic in user_weakest_link_state.topics]
         )
-        for progress in progresses:
-            if progress.is_practice_completed():
-                WeakestLinkTopic.objects.filter(user=user, semester=semester).delete()
-                WeakestLinkProblem.objects.filter(user=user, semester=semester).delete()
-                update_user_weakest_link_state(user, semester, WeakestLinkState.NONE)
-                return
+        if any(progress.is_practice_completed() for progress in progresses):
+            clear_weakest_link_queue(user_weakest_link_state)
 
+    change_weakest_link_state(user, semester, stop)
 
-def next_weakest_link_problem(user: User, semester: Semester) -> Problem | None:
+
+def interrupt_weakest_link(user: User, semester: Semester):
+    """Прерывает поиск слабого звена, если он запущен, и очищает его очередь."""
+    def interrupt(user_weakest_link_state: UserWeakestLinkState):
+        if user_weakest_link_state.state == WeakestLinkState.IN_PROGRESS:
+            clear_weakest_link_queue(user_weakest_link_state)
+
+    change_weakest_link_state(user, semester, interrupt)
+
+
+def next_weakest_link_problem(user: User, semester: Semester,
+                              snapshot: StudentSnapshot = None) -> Problem | None:
     """Возвращает следующее задание из очереди слабого звена.
     Если по основной теме задания набран балл на максимальную оценку,
     группа удаляется вне зависимости от количества решенных заданий.
     Если все группы удалены, возвращает None.
     """
-    group_numbers = WeakestLinkProblem.objects.filter(
-        user=user,
-        semester=semester,
-        is_solved__isnull=True
-    ).order_by('group_number').values_list('group_number', flat=True).distinct()
-    for group_number in group_numbers:
-        weakest_link_problem = WeakestLinkProblem.objects.filter(
-            user=user,
-            semester=semester,
-            is_solved__isnull=True,
-            group_number=group_number
-        ).first()
-        progress = Progress.objects.get(
-            user=user,
-            semester=semester,
-            topic=weakest_link_problem.problem.main_topic
-        )
-        if progress.points < Constants.TOPIC_THRESHOLD_HIGH:
-            return weakest_link_problem.problem
-        delete_group_topics_and_problems(user, semester, group_number)
-    weakest_link_done(user, semester)
+    def get_next_problem(user_weakest_link_state: UserWeakestLinkState) -> tuple[Problem | None, list[str]]:
+        not_solved_problems = [problem for problem in user_weakest_link_state.problems
+                               if problem['is_solved'] is None]
+        for group_number in sorted({problem['group_number'] for problem in not_solved_problems}):
+            problem_id = next(problem['problem'] for problem in not_solved_problems
+                              if problem['group_number'] == group_number)
+            problem = Problem.objects.get(pk=problem_id)
+            if snapshot is not None:
+                progress = snapshot.get_progress(problem.main_topic_id)
+            else:
+                progress = Progress.objects.get(user=user, semester=semester, topic=problem.main_topic)
+            if progress.points < Constants.TOPIC_THRESHOLD_HIGH:
+                return problem, []
+            delete_group_topics_and_problems(user_weakest_link_state, group_number)
+        return None, weakest_link_done(user_weakest_link_state)
+
+    problem, _ = change_weakest_link_state(
+        user, semester, get_next_problem,
+        lambda result: decrease_user_skill_level_after_weakest_link(user, semester, result[1])
+    )
+    if problem is not None:
+        return problem
+    if snapshot is not None:
+        snapshot.reload_progresses()
+        snapshot.weakest_link_state = WeakestLinkState.NONE
     return None
@@ -0,0 +1,40 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from algorithm.models import TopicGraphEdge
+from algorithm.problem_selector.problem_catalog import invalidate_problem_catalog
+from algorithm.problem_selector.topic_graph import invalidate_topic_graph
+from courses.models import Course, Module, Topic, Problem
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_course_problem_catalog(sender, instance, **kwargs):
+    invalidate_problem_catalog(instance.id)
+    invalidate_topic_graph(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Module)
+def invalidate_module_problem_catalog(sender, instance, **kwargs):
+    invalidate_problem_catalog(instance.course_id)
+    invalidate_topic_graph(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def invalidate_topic_problem_catalog(sender, instance, **kwargs):
+    invalidate_problem_catalog()
+    invalidate_topic_graph()
+
+
+@receiver([post_save, post_delete], sender=TopicGraphEdge)
+def invalidate_edge_topic_graph(sender, instance, **kwargs):
+    invalidate_topic_graph(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Problem)
+def invalidate_problem_problem_catalog(sender, instance, **kwargs):
+    invalidate_problem_catalog()
+
+
+@receiver(m2m_changed, sender=Problem.sub_topics.through)
+def invalidate_sub_topics_problem_catalog(sender, instance, **kwargs):
+    invalidate_problem_catalog()
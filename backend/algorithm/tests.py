@@ -1,3 +1,169 @@
+import math
+import random
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from algorithm.models import Progress, UserAnswer
+from algorithm.problem_selector.data_generator import generate_test_data
+from algorithm.problem_selector.points_maximization import (calculate_problem_values, POINTS_BY_DIFFICULTY,
+                                                            DIFFICULTY_TO_POINTS_THRESHOLD)
+from algorithm.problem_selector.problem_catalog import get_problem_catalog, invalidate_problem_catalog
+from algorithm.problem_selector.student_snapshot import StudentSnapshot
+from algorithm.problem_selector.utils import filter_theory_problems, get_theory_threshold_low
+from config.settings import Constants
+from courses.models import Semester, Topic, Problem, Difficulty, Type, THEORY_TYPES
+
+
+class FilterTheoryProblemsTest(TestCase):
+    """Отбор теоретических заданий из каталога заданий курса по снимку
+    состояния студента выполняет один запрос и совпадает с отбором запросом
+    с соединениями таблиц.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_test_data()
+        cls.user = User.objects.get(username='admin')
+        cls.semester = Semester.objects.get(course__title='Test Course')
+        cls.topics = list(Topic.objects.filter(module__course=cls.semester.course).order_by('created_at'))
+
+    def setUp(self):
+        invalidate_problem_catalog()
+        get_problem_catalog(self.semester.course_id)
+
+    def assert_same_problems_in_one_query(self, topic: Topic):
+        snapshot = StudentSnapshot.load(self.user, self.semester)
+        progress = snapshot.get_progress(topic.id)
+        with self.assertNumQueries(1):
+            problems = filter_theory_problems(progress, snapshot)
+        self.assertTrue(problems)
+        self.assertEqual({problem.id for problem in problems},
+                         {problem.id for problem in filter_theory_problems(progress)})
+
+    def test_first_topic(self):
+        self.assert_same_problems_in_one_query(self.topics[0])
+
+    def test_excludes_answered_problems(self):
+        problems = filter_theory_problems(Progress.objects.get(user=self.user, semester=self.semester,
+                                                               topic=self.topics[0]))
+        for problem in list(problems)[:3]:
+            UserAnswer.objects.create(user=self.user, semester=self.semester, problem=problem,
+                                      is_solved=True, coefficient=1.0)
+        self.assert_same_problems_in_one_query(self.topics[0])
+
+    def test_topic_with_completed_parent_topic(self):
+        topic = next(topic for topic in self.topics if topic.parent_topic_id is not None)
+        Progress.objects.filter(user=self.user, semester=self.semester,
+                                topic_id=topic.parent_topic_id).update(theory_points=get_theory_threshold_low())
+        self.assert_same_problems_in_one_query(topic)
+
+    def test_topic_with_not_completed_parent_topic(self):
+        topic = next(topic for topic in self.topics if topic.parent_topic_id is not None)
+        snapshot = StudentSnapshot.load(self.user, self.semester)
+        progress = snapshot.get_progress(topic.id)
+        with self.assertNumQueries(0):
+            problems = filter_theory_problems(progress, snapshot)
+        self.assertEqual(problems, [])
+        self.assertFalse(filter_theory_problems(progress).exists())
+
+
+def calculate_problem_value(user: User, semester: Semester, problem: Problem) -> float:
+    """Рассчитывает "стоимость" одного задания по прогрессу из БД. Прежний
+    расчет по одному заданию, эталон для calculate_problem_values.
+    """
+    progress = Progress.objects.get(user=user, semester=semester, topic=problem.main_topic)
+    skill_level_coefficient = Constants.AVERAGE_SKILL_LEVEL / progress.skill_level
+    weighted_time_to_solve = problem.time_to_solve_in_seconds * skill_level_coefficient
+    points = calculate_points_if_problem_solved_correctly(progress, problem)
+    return math.inf if points == 0 else weighted_time_to_solve / (points * threshold_coefficient(progress))
+
+
+def threshold_coefficient(progress: Progress) -> float:
+    """Возвращает коэффициент ценности темы в зависимости от количества баллов."""
+    if progress.points < Constants.TOPIC_THRESHOLD_LOW:
+        return Constants.TOPIC_THRESHOLD_LOW_COEFFICIENT
+    if progress.points < Constants.TOPIC_THRESHOLD_MEDIUM:
+        return Constants.TOPIC_THRESHOLD_MEDIUM_COEFFICIENT
+    return Constants.TOPIC_THRESHOLD_HIGH_COEFFICIENT
+
+
+def calculate_points_if_problem_solved_correctly(progress: Progress, problem: Problem) -> float:
+    """Возвращает общее количество баллов, которое получит пользователь при
+    правильном решении задания.
+    """
+    sub_topics_progresses = Progress.objects.filter(
+        user=progress.user,
+        semester=progress.semester,
+        topic__in=problem.sub_topics.all()
+    )
+    main_topic_points = POINTS_BY_DIFFICULTY[problem.difficulty]
+    sub_topic_points = POINTS_BY_DIFFICULTY[problem.difficulty] * Constants.SUB_TOPIC_POINTS_COEFFICIENT
+    points_threshold = DIFFICULTY_TO_POINTS_THRESHOLD[problem.difficulty]
+    if progress.points >= points_threshold:
+        total_points = 0
+    else:
+        if progress.points + main_topic_points >= points_threshold:
+            main_topic_points = points_threshold - progress.points
+        total_points = points_if_problem_solved_correctly(progress, main_topic_points, problem)
+    for sub_topic_progress in sub_topics_progresses:
+        if sub_topic_progress.points >= Constants.SUB_TOPIC_POINTS_THRESHOLD:
+            continue
+        points = sub_topic_points
+        if sub_topic_progress.points + points >= Constants.SUB_TOPIC_POINTS_THRESHOLD:
+            points = Constants.SUB_TOPIC_POINTS_THRESHOLD - sub_topic_progress.points
+        total_points += points_if_problem_solved_correctly(sub_topic_progress, points, problem)
+    return total_points
+
+
+def points_if_problem_solved_correctly(progress: Progress, points: float, problem: Problem) -> float:
+    """Возвращает количество баллов, которое получит пользователь,
+    если решит теоретическое или практическое задание правильно.
+    """
+    if problem.type in THEORY_TYPES:
+        current_points, max_points = progress.theory_points, Constants.TOPIC_THEORY_MAX_POINTS
+    else:
+        current_points, max_points = progress.practice_points, Constants.TOPIC_PRACTICE_MAX_POINTS
+    if current_points >= max_points:
+        return 0
+    elif current_points + points > max_points:
+        return max_points - current_points
+    else:
+        return points
+
+
+class CalculateProblemValuesTest(TestCase):
+    """"Стоимость" заданий, рассчитанная для всех кандидатов сразу, совпадает
+    с расчетом по одному заданию.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_test_data()
+        cls.user = User.objects.get(username='admin')
+        cls.semester = Semester.objects.get(course__title='Test Course')
+        topics = list(Topic.objects.filter(module__course=cls.semester.course).order_by('created_at'))
+        rng = random.Random(1)
+        for progress in Progress.objects.filter(user=cls.user, semester=cls.semester):
+            progress.theory_points = rng.choice([0.0, rng.uniform(0, Constants.TOPIC_THEORY_MAX_POINTS),
+                                                 Constants.TOPIC_THEORY_MAX_POINTS])
+            progress.practice_points = rng.choice([0.0, rng.uniform(0, Constants.TOPIC_PRACTICE_MAX_POINTS),
+                                                   Constants.TOPIC_PRACTICE_MAX_POINTS])
+            progress.skill_level = rng.uniform(Constants.ALGORITHM_SKILL_LEVEL_LOWER_BOUND, 3.0)
+            progress.save()
+        for i, topic in enumerate(topics[1:], start=1):
+            problem = Problem.objects.create(title=f'Code Problem {i}', description='Lorem Ipsum',
+                                             type=Type.CODE.value, difficulty=rng.choice(list(Difficulty)).value,
+                                             time_to_solve_in_seconds=600, main_topic=topic)
+            problem.sub_topics.add(*rng.sample(topics[:i], k=min(i, 3)))
+        problems = Problem.objects.filter(main_topic__module__course=cls.semester.course).order_by('title')
+        cls.problems = list(problems.filter(type=Type.CODE.value)) + list(problems.exclude(type=Type.CODE.value)[::10])
+
+    def test_values_match_value_of_each_problem(self):
+        values = calculate_problem_values(self.user, self.semester, self.problems)
+        self.assertEqual(len(values), len(self.problems))
+        for problem, value in zip(self.problems, values):
+            self.assertAlmostEqual(value, calculate_problem_value(self.user, self.semester, problem), places=9,
+                                   msg=problem.title)
+        self.assertTrue(any(value == math.inf for value in values))
+        self.assertTrue(any(value != math.inf for value in values))
@@ -1,7 +1,10 @@
+from uuid import UUID
+
 from django.contrib.auth.models import User
+from django.db.models import F
 
 from algorithm.models import (Progress, UserWeakestLinkState, UserAnswer,
-                              WeakestLinkState, UserTargetPoints)
+                              WeakestLinkState, UserTargetPoints, UserProgressVersion)
 from courses.models import Semester, Problem
 from courses.utils import is_problem_answered
 
@@ -25,6 +28,7 @@ def create_user_progress_if_not_exists(semester: Semester, user: User):
         UserWeakestLinkState.objects.create(user=user,
                                             semester=semester,
                                             state=WeakestLinkState.NONE)
+    UserProgressVersion.objects.get_or_create(user=user, semester=semester)
 
 
 def skip_problem(user: User, semester: Semester, problem: Problem):
@@ -38,6 +42,38 @@ def skip_problem(user: User, semester: Semester, problem: Problem):
         coefficient=0,
         is_solved=None
     )
+    bump_progress_version(user.id, semester.id)
+
+
+def get_progress_version(user_id: int, semester_id: UUID) -> int:
+    """Возвращает текущую версию состояния студента в семестре."""
+    version = UserProgressVersion.objects.filter(
+        user_id=user_id,
+        semester_id=semester_id
+    ).values_list('version', flat=True).first()
+    return 0 if version is None else version
+
+
+def get_progress_versions(user_ids: list[int], semester_id: UUID) -> dict[int, int]:
+    """Возвращает текущие версии состояния студентов в семестре
+    (ключ — id пользователя).
+    """
+    versions = dict(UserProgressVersion.objects.filter(
+        user_id__in=user_ids,
+        semester_id=semester_id
+    ).values_list('user_id', 'version'))
+    return {user_id: versions.get(user_id, 0) for user_id in user_ids}
+
+
+def bump_progress_version(user_id: int, semester_id: UUID):
+    """Увеличивает версию состояния студента в семестре."""
+    is_updated = UserProgressVersion.objects.filter(
+        user_id=user_id,
+        semester_id=semester_id
+    ).update(version=F('version') + 1)
+    if not is_updated:
+        UserProgressVersion.objects.get_or_create(user_id=user_id, semester_id=semester_id,
+                                                  defaults={'version': 1})
 
 
 def format_log_problem(user: User, problem: Problem) -> str:
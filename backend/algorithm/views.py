@@ -7,11 +7,9 @@ from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import render
 from django.utils import timezone
 
-from algorithm.models import Progress, UserWeakestLinkState, WeakestLinkState, WeakestLinkTopic, WeakestLinkProblem
-from algorithm.problem_selector.weakest_link import update_user_weakest_link_state
+from algorithm.problem_selector.next_problem_queue import select_next_problem
+from algorithm.problem_selector.weakest_link import interrupt_weakest_link
 from algorithm.utils import create_user_progress_if_not_exists, skip_problem
-from algorithm.problem_selector import (next_theory_problem as get_next_theory_problem,
-                                        next_practice_problem as get_next_practice_problem)
 from courses.models import Semester, SemesterCode, Problem
 from answers.utils import get_answer_safe_data
 
@@ -45,13 +43,11 @@ def next_theory_problem(request: HttpRequest,
     if not request.user.is_authenticated:
         return render(request, 'error.html', {'message': 'Войдите в систему.'}, status=401)
     try:
-        progress = Progress.objects.get(user=request.user,
-                                        semester_id=semester_pk,
-                                        topic_id=topic_pk)
-        problem = get_next_theory_problem(progress)
+        semester = Semester.objects.get(pk=semester_pk)
+        problem = select_next_problem(request.user, semester, topic_pk)
         answer = get_answer_safe_data(problem)
         context = {
-            'semester': progress.semester,
+            'semester': semester,
             'problem': problem,
             'answer': json.dumps(answer),
             'type': 'theory',
@@ -72,7 +68,7 @@ def next_practice_problem(request: HttpRequest,
         return render(request, 'error.html', {'message': 'Войдите в систему.'}, status=401)
     try:
         semester = Semester.objects.get(pk=semester_pk)
-        problem = get_next_practice_problem(request.user, semester)
+        problem = select_next_problem(request.user, semester)
         answer = get_answer_safe_data(problem)
         context = {
             'semester': semester,
@@ -112,9 +108,5 @@ def skip_practice_problem(request: HttpRequest, semester_pk: UUID, problem_pk: U
     problem = Problem.objects.get(pk=problem_pk)
     skip_problem(request.user, semester, problem)
     logger.info(f'(   ) {request.user.username:<10} [задание {problem.title} пропущено]')
-    user_weakest_link_state = UserWeakestLinkState.objects.get(user=request.user, semester=semester).state
-    if user_weakest_link_state == WeakestLinkState.IN_PROGRESS:
-        WeakestLinkTopic.objects.filter(user=request.user, semester=semester).delete()
-        WeakestLinkProblem.objects.filter(user=request.user, semester=semester).delete()
-        update_user_weakest_link_state(request.user, semester, WeakestLinkState.NONE)
+    interrupt_weakest_link(request.user, semester)
     return next_practice_problem(request, semester_pk)
@@ -1,20 +1,25 @@
 import logging
+from dataclasses import dataclass
+from uuid import UUID
 
 from django.contrib.auth.models import User
 from django.db import transaction
-from django.db.models import QuerySet
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 
 from algorithm.models import UserAnswer, Progress, UserWeakestLinkState, WeakestLinkState
-from algorithm.problem_selector.utils import get_last_theory_user_answers
-from algorithm.problem_selector.weakest_link import (check_weakest_link,
+from algorithm.background import run_in_background_on_commit
+from algorithm.problem_selector.next_problem_queue import prefetch_next_problem
+from algorithm.problem_selector.student_snapshot import StudentSnapshot
+from algorithm.problem_selector.weakest_link import (check_weakest_link, lock_weakest_link_state,
                                                      start_weakest_link_when_ready,
                                                      stop_weakest_link_when_practice_completed)
-from algorithm.utils import format_log_problem
+from algorithm.utils import format_log_problem, bump_progress_version
 from config.settings import Constants
 from .models import Answer, CodeAnswer
 from courses.models import Problem, Semester, PRACTICE_TYPES, Type, THEORY_TYPES, Difficulty
-from .points_management import add_points_for_problem, add_placement_points_for_problem
-from .utils import GivenAnswer
+from .points_management import add_points_for_problem, add_placement_points_for_problem, lock_problem_progresses
+from .utils import GivenAnswer, get_answer_access_error, get_problem_answers, is_problem_answered_in
 
 DIFFICULTY_COEFFICIENT = {
     Difficulty.EASY.value: Constants.ALGORITHM_CORRECT_ANSWER_BONUS_EASY,
@@ -25,99 +30,273 @@ DIFFICULTY_COEFFICIENT = {
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class AppliedAnswer:
+    """Результат применения ответа пользователя, нужный фоновому этапу.
+
+    progresses — заблокированный прогресс по темам задания (ключ — id темы).
+    topic_id — тема следующего теоретического задания или None для практического.
+    log_message — запись в журнал или None, если ответ дан в калибровке
+    и поиск слабого звена после него не обслуживается.
+    """
+    progresses: dict[UUID, Progress]
+    topic_id: UUID | None
+    is_weakest_link_done: bool = False
+    log_message: str | None = None
+
+
 @transaction.atomic
 def create_user_answer(user: User, semester: Semester, problem: Problem,
-                       coefficient: float, answer: GivenAnswer, time_elapsed_in_seconds: float | None):
+                       coefficient: float, answer: GivenAnswer, time_elapsed_in_seconds: float | None,
+                       snapshot: StudentSnapshot = None):
     """Создает ответ пользователя на задание и добавляет баллы в его
-    главную тему и подтемы.
+    главную тему и подтемы. Если передан снимок состояния студента,
+    он обновляется после записи ответа. Запуск и прерывание поиска
+    слабого звена, запись в журнал и подбор следующего задания
+    выполняются в фоне после фиксации транзакции (finish_user_answer).
+
+    Параллельные ответы одного студента применяются по очереди: в начале
+    транзакции блокируется строка состояния алгоритма поиска слабого звена,
+    затем прогресс по темам задания в порядке id тем.
     """
-    is_solved = coefficient >= Constants.MIN_CORRECT_ANSWER_COEFFICIENT
-    is_weakest_link_done = False
-    if problem.type in PRACTICE_TYPES:
-        is_weakest_link_done = check_weakest_link(user, semester, problem, is_solved)
+    lock_weakest_link_state(user, semester)
     user_answer = UserAnswer.objects.create(
         user=user,
         semester=semester,
         problem=problem,
-        is_solved=is_solved,
+        is_solved=coefficient >= Constants.MIN_CORRECT_ANSWER_COEFFICIENT,
         coefficient=coefficient,
         time_elapsed_in_seconds=time_elapsed_in_seconds
     )
-    create_given_user_answers(problem.type, answer, user_answer)
-    progress = Progress.objects.filter(
-        user=user,
-        semester=semester,
-        topic=problem.main_topic
-    ).first()
+    save_given_user_answers(build_given_user_answers(problem.type, answer, user_answer))
+    bump_progress_version(user.id, semester.id)
+    finish_user_answer_on_commit(user, semester, apply_user_answer(user_answer, snapshot))
+
+
+@transaction.atomic
+def create_user_answers(user: User, semester: Semester,
+                        answers: list[tuple[Problem, float, GivenAnswer, float | None]]
+                        ) -> list[tuple[UserAnswer, bool] | str]:
+    """Создает ответы пользователя на задания в порядке списка answers
+    (задание, коэффициент, ответ, время решения) в одной транзакции.
+    Баллы начисляются так же, как в create_user_answer, а UserAnswer и Answer
+    сохраняются пакетно.
+
+    Запуск и прерывание поиска слабого звена проверяются после каждого ответа
+    в этой же транзакции под уже взятой блокировкой состояния, как если бы
+    ответы отправлялись по одному; перед проверкой накопленные UserAnswer
+    сохраняются, так как условие на запуск читает историю ответов. В фоне
+    после фиксации остаются только запись в журнал и подбор следующего задания.
+
+    Доступ к каждому заданию проверяется get_answer_access_error по прогрессу
+    и ответам, загруженным один раз и обновляемым после каждого ответа.
+    Для каждого ответа возвращает созданный UserAnswer и признак того, что
+    на задание после него дан ответ (is_problem_answered), или сообщение об ошибке.
+    """
+    lock_weakest_link_state(user, semester)
+    progresses = {progress.topic_id: progress
+                  for progress in Progress.objects.filter(user=user, semester=semester)}
+    problem_answers = get_problem_answers(user, semester)
+    results = []
+    unsaved_user_answers = []
+    given_answers = []
+    applied_answers = []
+    for problem, coefficient, answer, time_elapsed_in_seconds in answers:
+        error = get_answer_access_error(problem, progresses, problem_answers.get(problem.id, []))
+        if error is not None:
+            results.append(error)
+            continue
+        user_answer = UserAnswer(
+            user=user,
+            semester=semester,
+            problem=problem,
+            is_solved=coefficient >= Constants.MIN_CORRECT_ANSWER_COEFFICIENT,
+            coefficient=coefficient,
+            time_elapsed_in_seconds=time_elapsed_in_seconds
+        )
+        given_answers.extend(build_given_user_answers(problem.type, answer, user_answer))
+        unsaved_user_answers.append(user_answer)
+        applied_answer = apply_user_answer(user_answer)
+        progresses.update(applied_answer.progresses)
+        applied_answers.append(applied_answer)
+        if applied_answer.log_message is not None:
+            UserAnswer.objects.bulk_create(unsaved_user_answers)
+            unsaved_user_answers = []
+            start_or_stop_weakest_link(user, semester, applied_answer.is_weakest_link_done)
+        answers_to_problem = problem_answers.setdefault(problem.id, [])
+        answers_to_problem.append(user_answer.is_solved)
+        results.append((user_answer, is_problem_answered_in(problem, answers_to_problem)))
+    if applied_answers:
+        UserAnswer.objects.bulk_create(unsaved_user_answers)
+        save_given_user_answers(given_answers)
+        bump_progress_version(user.id, semester.id)
+        log_messages = [applied_answer.log_message for applied_answer in applied_answers
+                        if applied_answer.log_message is not None]
+        run_in_background_on_commit(finish_user_answers, user.id, semester.id,
+                                    applied_answers[-1].topic_id, log_messages)
+    return results
+
+
+def apply_user_answer(user_answer: UserAnswer, snapshot: StudentSnapshot = None) -> AppliedAnswer:
+    """Применяет ответ пользователя: обслуживает поиск слабого звена, изменяет
+    уровень знаний и добавляет баллы в главную тему и подтемы задания.
+    Вызывается после блокировки состояния алгоритма поиска слабого звена.
+    """
+    user, semester, problem = user_answer.user, user_answer.semester, user_answer.problem
+    is_solved = user_answer.is_solved
+    coefficient = user_answer.coefficient
+    time_elapsed_in_seconds = user_answer.time_elapsed_in_seconds
+    is_weakest_link_done = False
+    if problem.type in PRACTICE_TYPES:
+        is_weakest_link_done = check_weakest_link(user, semester, problem, is_solved)
+    progresses = lock_problem_progresses(user, semester, problem)
+    progress = progresses[problem.main_topic_id]
     points = (progress.theory_points, progress.practice_points, progress.skill_level)
     if problem.type in THEORY_TYPES:
-        last_answers = get_last_theory_user_answers(user, problem.main_topic)
-        if len(last_answers) <= Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_ANSWERS:
+        register_placement_answer(progress, user_answer)
+        if progress.placement_answers_count <= Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_ANSWERS:
             if is_solved:
-                add_placement_points_for_problem(progress, user_answer)
-            if len(last_answers) == Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_ANSWERS:
-                progress.refresh_from_db()
-                placement_change_skill_level(progress, last_answers)
-            return
+                add_placement_points_for_problem(progress, user_answer, progresses)
+            if progress.placement_answers_count == Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_ANSWERS:
+                placement_change_skill_level(progress)
+            if snapshot is not None:
+                snapshot.register_answer(user_answer)
+            return AppliedAnswer(progresses, problem.main_topic_id)
     change_user_skill_level(progress, user_answer)
     if is_solved:
-        add_points_for_problem(user, semester, problem, coefficient)
-    progress.refresh_from_db()
+        add_points_for_problem(user, semester, problem, coefficient, progresses)
     new_points = (progress.theory_points, progress.practice_points, progress.skill_level)
     delta = [new_points[i] - points[i] for i in range(3)]
     points_info = ' / '.join(f'{new_points[i]:.2f} ({"+" if delta[i] >= 0 else ""}{delta[i]})'
                              for i in range(3))
-    logger.info(f'(   ) {format_log_problem(user, problem)}'
-                f' [ответ принят] is_solved {is_solved} time {time_elapsed_in_seconds}'
-                f' {points_info}')
+    log_message = (f'(   ) {format_log_problem(user, problem)}'
+                   f' [ответ принят] is_solved {is_solved} time {time_elapsed_in_seconds}'
+                   f' {points_info}')
+    topic_id = None if problem.type in PRACTICE_TYPES else problem.main_topic_id
+    if snapshot is not None:
+        snapshot.register_answer(user_answer)
+        snapshot.reload_weakest_link_state()
+    return AppliedAnswer(progresses, topic_id, is_weakest_link_done, log_message)
+
+
+def finish_user_answer_on_commit(user: User, semester: Semester, applied_answer: AppliedAnswer):
+    """Планирует фоновый этап обработки ответа после фиксации транзакции.
+    Если ответ дан в калибровке, только подбирается следующее задание.
+    """
+    if applied_answer.log_message is None:
+        run_in_background_on_commit(prefetch_next_problem, user.id, semester.id, applied_answer.topic_id)
+        return
+    run_in_background_on_commit(finish_user_answer, user.id, semester.id, applied_answer.topic_id,
+                                applied_answer.is_weakest_link_done, applied_answer.log_message)
+
+
+def finish_user_answer(user_id: int, semester_id: UUID, topic_id: UUID | None,
+                       is_weakest_link_done: bool, log_message: str):
+    """Фоновый этап обработки ответа после фиксации транзакции: записывает
+    ответ в журнал, обслуживает поиск слабого звена и подбирает следующее
+    задание (теоретическое по теме topic_id или практическое).
+    """
+    logger.info(log_message)
+    user = User.objects.get(pk=user_id)
+    semester = Semester.objects.get(pk=semester_id)
+    update_weakest_link_after_answer(user, semester, is_weakest_link_done)
+    prefetch_next_problem(user_id, semester_id, topic_id)
+
+
+def finish_user_answers(user_id: int, semester_id: UUID, topic_id: UUID | None, log_messages: list[str]):
+    """Фоновый этап обработки пакета ответов после фиксации транзакции:
+    записывает ответы в журнал и подбирает следующее задание. Поиск слабого
+    звена обслуживается в транзакции create_user_answers.
+    """
+    for log_message in log_messages:
+        logger.info(log_message)
+    prefetch_next_problem(user_id, semester_id, topic_id)
+
+
+@transaction.atomic
+def update_weakest_link_after_answer(user: User, semester: Semester, is_weakest_link_done: bool):
+    """Блокирует состояние алгоритма поиска слабого звена и обслуживает его
+    после ответа (start_or_stop_weakest_link).
+
+    Выполняется в фоне после фиксации ответа, поэтому next_practice_problem,
+    вызванный сразу после ответа, может вернуть обычное задание вместо задания
+    из очереди слабого звена. Эта задержка допустима: очередь начинает
+    использоваться, как только фоновый этап завершится.
+    """
+    lock_weakest_link_state(user, semester)
+    start_or_stop_weakest_link(user, semester, is_weakest_link_done)
+
+
+def start_or_stop_weakest_link(user: User, semester: Semester, is_weakest_link_done: bool):
+    """Запускает поиск слабого звена, если выполнено условие на запуск,
+    и прерывает его, если по одной из проблемных тем завершена практика.
+    Вызывается под блокировкой состояния алгоритма поиска слабого звена.
+    """
     user_weakest_link_state = UserWeakestLinkState.objects.get(user=user, semester=semester)
     if user_weakest_link_state.state == WeakestLinkState.NONE and not is_weakest_link_done:
         start_weakest_link_when_ready(user, semester)
     stop_weakest_link_when_practice_completed(user, semester)
 
 
-def create_given_user_answers(problem_type: str,
-                              answer: GivenAnswer,
-                              user_answer: UserAnswer):
-    """Создает список Answer с выбранными/введенными ответами пользователя."""
+def build_given_user_answers(problem_type: str,
+                             answer: GivenAnswer,
+                             user_answer: UserAnswer) -> list[Answer]:
+    """Возвращает список несохраненных Answer с выбранными/введенными
+    ответами пользователя.
+    """
     match problem_type:
         case Type.MULTIPLE_CHOICE_RADIO.value:
-            Answer.objects.create(multiple_choice_radio=answer, user_answer=user_answer)
+            return [Answer(multiple_choice_radio=answer, user_answer=user_answer)]
         case Type.MULTIPLE_CHOICE_CHECKBOX.value:
-            for ans in answer:
-                Answer.objects.create(multiple_choice_checkbox=ans, user_answer=user_answer)
+            return [Answer(multiple_choice_checkbox=ans, user_answer=user_answer) for ans in answer]
         case Type.FILL_IN_SINGLE_BLANK.value:
-            Answer.objects.create(fill_in_single_blank=answer, user_answer=user_answer)
+            return [Answer(fill_in_single_blank=answer, user_answer=user_answer)]
         case Type.CODE.value:
-            code_answer = CodeAnswer.objects.create(
+            code_answer = CodeAnswer(
                 code=user_answer.problem.code_set.first(),
                 user_code=answer[0],
                 tests_result=answer[1]
             )
-            Answer.objects.create(code_answer=code_answer, user_answer=user_answer)
+            return [Answer(code_answer=code_answer, user_answer=user_answer)]
         case other_type:
             raise ValueError(f'Неизвестный тип {other_type}.')
 
 
-def placement_change_skill_level(progress: Progress, last_answers: QuerySet[UserAnswer]):
+def save_given_user_answers(answers: list[Answer]):
+    """Сохраняет Answer и решения заданий на написание кода пакетными INSERT."""
+    CodeAnswer.objects.bulk_create([answer.code_answer for answer in answers if answer.code_answer is not None])
+    Answer.objects.bulk_create(answers)
+
+
+def register_placement_answer(progress: Progress, user_answer: UserAnswer):
+    """Учитывает ответ на теоретическое задание в калибровке: увеличивает
+    количество ответов по теме и обновляет текущую и наибольшую сумму
+    коэффициентов правильно решенных заданий подряд.
+    """
+    if user_answer.is_solved:
+        streak = F('placement_streak') + user_answer.coefficient
+        Progress.objects.filter(pk=progress.pk).update(
+            placement_answers_count=F('placement_answers_count') + 1,
+            placement_streak=streak,
+            placement_longest_streak=Greatest(F('placement_longest_streak'), streak)
+        )
+        progress.placement_streak += user_answer.coefficient
+        progress.placement_longest_streak = max(progress.placement_longest_streak, progress.placement_streak)
+    else:
+        Progress.objects.filter(pk=progress.pk).update(
+            placement_answers_count=F('placement_answers_count') + 1,
+            placement_streak=0.0
+        )
+        progress.placement_streak = 0.0
+    progress.placement_answers_count += 1
+
+
+def placement_change_skill_level(progress: Progress):
     """На основе калибровки изменяет уровень знаний по теме."""
-    longest_streak = calculate_longest_solved_streak(last_answers)
-    progress.skill_level += (longest_streak * Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_BONUS
-                             - Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_BIAS)
-    progress.save()
-
-
-def calculate_longest_solved_streak(last_answers: QuerySet[UserAnswer]) -> float:
-    """Возвращает наибольшую сумму коэффициентов правильно решенных заданий подряд."""
-    longest_streak = 0.0
-    current_streak = 0.0
-    for answer in last_answers:
-        if answer.is_solved:
-            current_streak += answer.coefficient
-        else:
-            longest_streak = max(longest_streak, current_streak)
-            current_streak = 0.0
-    return max(longest_streak, current_streak)
+    delta = (progress.placement_longest_streak * Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_BONUS
+             - Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_BIAS)
+    Progress.objects.filter(pk=progress.pk).update(skill_level=F('skill_level') + delta)
+    progress.skill_level += delta
 
 
 def change_user_skill_level(progress: Progress, user_answer: UserAnswer):
@@ -126,10 +305,13 @@ def change_user_skill_level(progress: Progress, user_answer: UserAnswer):
     """
     difficulty_coefficient = DIFFICULTY_COEFFICIENT[user_answer.problem.difficulty]
     if user_answer.is_solved:
+        skill_level = F('skill_level') + difficulty_coefficient
         progress.skill_level += difficulty_coefficient
     else:
+        skill_level = Greatest(F('skill_level') - difficulty_coefficient,
+                               Value(Constants.ALGORITHM_SKILL_LEVEL_LOWER_BOUND))
         if progress.skill_level - difficulty_coefficient < Constants.ALGORITHM_SKILL_LEVEL_LOWER_BOUND:
             progress.skill_level = Constants.ALGORITHM_SKILL_LEVEL_LOWER_BOUND
         else:
             progress.skill_level -= difficulty_coefficient
-    progress.save()
+    Progress.objects.filter(pk=progress.pk).update(skill_level=skill_level)
@@ -1,4 +1,8 @@
+from uuid import UUID
+
 from django.contrib.auth.models import User
+from django.db.models import Q, F, Case, When, Value
+from django.db.models.functions import Least, Greatest
 
 from algorithm.models import Progress, UserAnswer
 from config.settings import Constants
@@ -18,15 +22,54 @@ DIFFICULTY_TO_POINTS_THRESHOLD = {
 }
 
 
-def add_points_for_problem(user: User, semester: Semester, problem: Problem, coefficient: float):
-    """Добавляет баллы во все темы задания."""
+def lock_problem_progresses(user: User, semester: Semester, problem: Problem) -> dict[UUID, Progress]:
+    """Блокирует строки прогресса по основной теме и подтемам задания до конца
+    транзакции. Строки блокируются в порядке id тем, поэтому параллельные
+    ответы одного студента ожидают друг друга, а не блокируют взаимно.
+    Ключ словаря — id темы.
+    """
+    progresses = Progress.objects.select_for_update().filter(
+        Q(topic_id=problem.main_topic_id)
+        | Q(topic_id__in=Problem.sub_topics.through.objects.filter(problem=problem).values('topic_id')),
+        user=user,
+        semester=semester
+    ).order_by('topic_id')
+    return {progress.topic_id: progress for progress in progresses}
+
+
+def add_points_for_problem(user: User, semester: Semester, problem: Problem, coefficient: float,
+                           progresses: dict[UUID, Progress] = None) -> Progress | None:
+    """Добавляет баллы во все темы задания одним UPDATE, в котором приращения
+    ограничиваются порогами тем и максимальным баллом (LEAST/GREATEST), так что
+    параллельные ответы не теряют баллы и не превышают максимум.
+    Если заблокированный прогресс по темам задания не передан, он блокируется
+    здесь. Переданные объекты Progress обновляются так же, как строки в БД.
+    Возвращает обновленный прогресс по основной теме задания.
+    """
+    if progresses is None:
+        progresses = lock_problem_progresses(user, semester, problem)
+    if not progresses:
+        return None
     points = coefficient * POINTS_BY_DIFFICULTY[problem.difficulty]
     sub_topic_points = coefficient * points * Constants.SUB_TOPIC_POINTS_COEFFICIENT
-    progress = Progress.objects.filter(user=user, semester=semester, topic=problem.main_topic).first()
-    add_points_to_main_topic(progress, problem, points)
-    for topic in problem.sub_topics.all():
-        progress = Progress.objects.filter(user=user, semester=semester, topic=topic).first()
-        add_points_to_sub_topic(progress, problem, sub_topic_points)
+    points_field = get_points_field(problem)
+    max_points = (Constants.TOPIC_THEORY_MAX_POINTS if points_field == 'theory_points'
+                  else Constants.TOPIC_PRACTICE_MAX_POINTS)
+    is_main_topic = Q(topic_id=problem.main_topic_id)
+    topic_points = Case(When(is_main_topic, then=Value(points)), default=Value(sub_topic_points))
+    points_threshold = Case(When(is_main_topic, then=Value(DIFFICULTY_TO_POINTS_THRESHOLD[problem.difficulty])),
+                            default=Value(Constants.SUB_TOPIC_POINTS_THRESHOLD))
+    points_to_threshold = points_threshold - F('theory_points') - F('practice_points')
+    Progress.objects.filter(pk__in=[progress.pk for progress in progresses.values()]).update(**{
+        points_field: Least(F(points_field) + Greatest(Least(topic_points, points_to_threshold), Value(0.0)),
+                            Value(max_points))
+    })
+    for topic_id, progress in progresses.items():
+        if topic_id == problem.main_topic_id:
+            add_points_to_main_topic(progress, problem, points)
+        else:
+            add_points_to_sub_topic(progress, problem, sub_topic_points)
+    return progresses.get(problem.main_topic_id)
 
 
 def add_points_to_main_topic(progress: Progress, problem: Problem, points: float):
@@ -52,16 +95,23 @@ def add_points_to_sub_topic(progress: Progress, problem: Problem, points: float)
         add_points_to_topic(progress, problem, points)
 
 
-def add_points_to_topic(progress: Progress, problem: Problem, points: float):
-    """Добавляет баллы в тему задания."""
+def get_points_field(problem: Problem) -> str:
+    """Возвращает поле Progress, в которое начисляются баллы за задание."""
     if problem.type in THEORY_TYPES:
-        add_theory_points(progress, points)
+        return 'theory_points'
     elif problem.type in PRACTICE_TYPES:
-        add_practice_points(progress, points)
+        return 'practice_points'
+    raise ValueError(f'Тип {problem.type} задания {problem}'
+                     f' не относится к теоретическим или'
+                     f' практическим типам.')
+
+
+def add_points_to_topic(progress: Progress, problem: Problem, points: float):
+    """Добавляет баллы в объект прогресса по теме без сохранения."""
+    if get_points_field(problem) == 'theory_points':
+        add_theory_points(progress, points)
     else:
-        raise ValueError(f'Тип {problem.type} задания {problem}'
-                         f' не относится к теоретическим или'
-                         f' практическим типам.')
+        add_practice_points(progress, points)
 
 
 def add_theory_points(progress: Progress, points: float):
@@ -70,7 +120,6 @@ def add_theory_points(progress: Progress, points: float):
         progress.theory_points = Constants.TOPIC_THEORY_MAX_POINTS
     else:
         progress.theory_points += points
-    progress.save()
 
 
 def add_practice_points(progress: Progress, points: float):
@@ -79,10 +128,12 @@ def add_practice_points(progress: Progress, points: float):
         progress.practice_points = Constants.TOPIC_PRACTICE_MAX_POINTS
     else:
         progress.practice_points += points
-    progress.save()
 
 
-def add_placement_points_for_problem(progress: Progress, user_answer: UserAnswer):
-    """Добавляет баллы во все темы задания с учетом коэффициента калибровки."""
+def add_placement_points_for_problem(progress: Progress, user_answer: UserAnswer,
+                                     progresses: dict[UUID, Progress] = None) -> Progress | None:
+    """Добавляет баллы во все темы задания с учетом коэффициента калибровки.
+    Возвращает обновленный прогресс по основной теме задания.
+    """
     coefficient = user_answer.coefficient * Constants.ALGORITHM_SKILL_LEVEL_PLACEMENT_POINTS_COEFFICIENT
-    add_points_for_problem(progress.user, progress.semester, user_answer.problem, coefficient)
+    return add_points_for_problem(progress.user, progress.semester, user_answer.problem, coefficient, progresses)
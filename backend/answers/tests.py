@@ -1,3 +1,208 @@
-from django.test import TestCase
+from functools import partial
+from threading import Thread
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from algorithm.models import Progress, UserAnswer, UserWeakestLinkState, WeakestLinkState
+from algorithm.problem_selector.data_generator import generate_test_data
+from algorithm.problem_selector.problem_catalog import invalidate_problem_catalog
+from algorithm.problem_selector.utils import get_theory_threshold_low
+from algorithm.problem_selector.weakest_link import lock_weakest_link_state
+from answers.create_answer import create_user_answer, create_user_answers
+from answers.models import Code
+from answers.points_management import lock_problem_progresses
+from answers.utils import GivenAnswer
+from config.settings import Constants
+from courses.models import Semester, Problem, Topic, Type, Difficulty, THEORY_TYPES
+
+
+def get_correct_answer(problem: Problem) -> GivenAnswer:
+    """Возвращает правильный ответ на теоретическое задание."""
+    match problem.type:
+        case Type.MULTIPLE_CHOICE_RADIO.value:
+            return problem.multiplechoiceradio_set.filter(is_correct=True).first()
+        case Type.MULTIPLE_CHOICE_CHECKBOX.value:
+            return list(problem.multiplechoicecheckbox_set.filter(is_correct=True))
+        case Type.FILL_IN_SINGLE_BLANK.value:
+            return problem.fillinsingleblank_set.first().text
+        case other_type:
+            raise ValueError(f'Задание типа {other_type} не поддерживается.')
+
+
+@mock.patch('answers.create_answer.run_in_background_on_commit')
+class ConcurrentAnswersTest(TransactionTestCase):
+    """Параллельные ответы одного студента применяются по очереди: сначала
+    блокируется состояние алгоритма поиска слабого звена, затем прогресс
+    по темам задания в порядке id тем, поэтому баллы не теряются.
+    """
+    number_of_threads = 16
+
+    def setUp(self):
+        generate_test_data()
+        self.user = User.objects.get(username='admin')
+        self.semester = Semester.objects.get(course__title='Test Course')
+        self.problem = Problem.objects.filter(
+            main_topic__module__course=self.semester.course,
+            type__in=THEORY_TYPES,
+            sub_topics__isnull=False
+        ).distinct().order_by('title').first()
+        self.answer = get_correct_answer(self.problem)
+
+    def get_problem_progresses(self) -> list[tuple[float, float, float]]:
+        topic_ids = [self.problem.main_topic_id, *self.problem.sub_topics.values_list('id', flat=True)]
+        return list(Progress.objects.filter(
+            user=self.user,
+            semester=self.semester,
+            topic_id__in=topic_ids
+        ).order_by('topic_id').values_list('theory_points', 'practice_points', 'skill_level'))
+
+    def test_locks_state_before_progresses_in_topic_order(self, run_in_background_on_commit):
+        calls = []
+
+        def record(name, function):
+            def wrapper(*args, **kwargs):
+                calls.append(name)
+                return function(*args, **kwargs)
+            return wrapper
+
+        with (mock.patch('answers.create_answer.lock_weakest_link_state',
+                         record('state', lock_weakest_link_state)),
+              mock.patch('answers.create_answer.lock_problem_progresses',
+                         record('progresses', lock_problem_progresses))):
+            create_user_answer(self.user, self.semester, self.problem, 1.0, self.answer, None)
+        self.assertEqual(calls, ['state', 'progresses'])
+
+        with transaction.atomic(), CaptureQueriesContext(connection) as context:
+            progresses = lock_problem_progresses(self.user, self.semester, self.problem)
+        self.assertEqual(len(progresses), 1 + self.problem.sub_topics.count())
+        self.assertEqual(list(progresses), sorted(progresses))
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', context.captured_queries[-1]['sql'])
+
+    @skipUnless(connection.features.has_select_for_update, 'Требуются блокировки строк SELECT ... FOR UPDATE.')
+    def test_concurrent_answers_match_sequential_answers(self, run_in_background_on_commit):
+        with transaction.atomic():
+            for _ in range(self.number_of_threads):
+                create_user_answer(self.user, self.semester, self.problem, 1.0, self.answer, None)
+            expected = self.get_problem_progresses()
+            transaction.set_rollback(True)
+
+        errors = []
+
+        def submit_answer():
+            try:
+                create_user_answer(self.user, self.semester, self.problem, 1.0, self.answer, None)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=submit_answer) for _ in range(self.number_of_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(UserAnswer.objects.filter(user=self.user, problem=self.problem).count(),
+                         self.number_of_threads)
+        actual = self.get_problem_progresses()
+        self.assertEqual(len(actual), len(expected))
+        for actual_values, expected_values in zip(actual, expected):
+            for actual_value, expected_value in zip(actual_values, expected_values):
+                self.assertAlmostEqual(actual_value, expected_value)
+        self.assertTrue(all(theory_points <= Constants.TOPIC_THEORY_MAX_POINTS for theory_points, _, _ in actual))
+
+
+def run_on_commit(function, *args, **kwargs):
+    """Заменяет run_in_background_on_commit: выполняет функцию после
+    фиксации транзакции в текущем потоке.
+    """
+    transaction.on_commit(partial(function, *args, **kwargs))
+
+
+@mock.patch('answers.create_answer.prefetch_next_problem')
+@mock.patch('answers.create_answer.run_in_background_on_commit', run_on_commit)
+class CreateUserAnswersTest(TestCase):
+    """Пакет ответов приводит к тому же прогрессу и состоянию алгоритма поиска
+    слабого звена, что и те же ответы, отправленные по одному, в том числе
+    когда поиск слабого звена запускается внутри пакета.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_test_data()
+        cls.user = User.objects.get(username='admin')
+        cls.semester = Semester.objects.get(course__title='Test Course')
+        cls.topic = Topic.objects.filter(module__course=cls.semester.course).order_by('created_at').first()
+        Progress.objects.filter(user=cls.user, semester=cls.semester,
+                                topic=cls.topic).update(theory_points=get_theory_threshold_low())
+        problems = [Problem.objects.create(title=f'Code Problem {i}', description='Lorem Ipsum',
+                                           type=Type.CODE.value, difficulty=Difficulty.NORMAL.value,
+                                           time_to_solve_in_seconds=600, main_topic=cls.topic)
+                    for i in range(1, 9)]
+        Code.objects.bulk_create([Code(problem=problem, tests='') for problem in problems])
+        cls.failed_problems = problems[:2]
+
+    def setUp(self):
+        invalidate_problem_catalog()
+
+    def get_state(self) -> tuple[list[tuple], tuple]:
+        progresses = Progress.objects.filter(user=self.user, semester=self.semester).order_by('topic_id')
+        user_weakest_link_state = UserWeakestLinkState.objects.get(user=self.user, semester=self.semester)
+        return (list(progresses.values_list('topic_id', 'theory_points', 'practice_points', 'skill_level',
+                                            'placement_answers_count')),
+                (user_weakest_link_state.state, user_weakest_link_state.problems, user_weakest_link_state.topics))
+
+    @staticmethod
+    def get_answer(problem: Problem, is_solved: bool) -> tuple[Problem, float, GivenAnswer, float]:
+        if is_solved:
+            return problem, 1.0, ('print(1)', 'OK'), 60.0
+        return problem, 0.0, ('print(0)', 'Failed'), 60.0
+
+    def answer_one_by_one(self) -> list[tuple[Problem, float, GivenAnswer, float]]:
+        """Отправляет ответы по одному: два раза неправильно решает два похожих
+        задания, что запускает поиск слабого звена, затем правильно решает
+        первое и неправильно второе задание первой группы очереди.
+        Возвращает отправленные ответы.
+        """
+        answers = [self.get_answer(problem, False) for problem in self.failed_problems for _ in range(2)]
+        for answer in answers:
+            with self.captureOnCommitCallbacks(execute=True):
+                create_user_answer(self.user, self.semester, *answer)
+        user_weakest_link_state = UserWeakestLinkState.objects.get(user=self.user, semester=self.semester)
+        self.assertEqual(user_weakest_link_state.state, WeakestLinkState.IN_PROGRESS)
+        queue_problems = [Problem.objects.get(pk=problem['problem'])
+                          for problem in user_weakest_link_state.problems if problem['group_number'] == 1]
+        for problem, is_solved in zip(queue_problems, (True, False)):
+            answer = self.get_answer(problem, is_solved)
+            with self.captureOnCommitCallbacks(execute=True):
+                create_user_answer(self.user, self.semester, *answer)
+            answers.append(answer)
+        return answers
+
+    def test_batch_matches_answers_one_by_one(self, prefetch_next_problem):
+        with transaction.atomic():
+            answers = self.answer_one_by_one()
+            expected = self.get_state()
+            transaction.set_rollback(True)
+        prefetch_next_problem.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            results = create_user_answers(self.user, self.semester, answers)
+
+        self.assertFalse([result for result in results if isinstance(result, str)])
+        self.assertEqual(UserAnswer.objects.filter(user=self.user, semester=self.semester).count(), len(answers))
+        actual = self.get_state()
+        self.assertEqual(expected[1][0], WeakestLinkState.IN_PROGRESS)
+        self.assertEqual(actual[1], expected[1])
+        self.assertEqual(len(actual[0]), len(expected[0]))
+        for (topic_id, *actual_values), (expected_topic_id, *expected_values) in zip(actual[0], expected[0]):
+            self.assertEqual(topic_id, expected_topic_id)
+            for actual_value, expected_value in zip(actual_values, expected_values):
+                self.assertAlmostEqual(actual_value, expected_value)
+        prefetch_next_problem.assert_called_once()
@@ -247,3 +247,52 @@ def validate_practice_problem(user: User, semester: Semester, problem: Problem)
     if number_of_answers >= Constants.MAX_NUMBER_OF_ATTEMPTS_PER_PRACTICE_PROBLEM:
         return JsonResponse(json.dumps({'error': 'Вы истратили все попытки на решение этого задания.'}), safe=False)
     return None
+
+
+def get_problem_answers(user: User, semester: Semester) -> dict[UUID, list[bool | None]]:
+    """Возвращает правильность ответов пользователя в семестре в порядке
+    отправки (None — задание пропущено). Ключ словаря — id задания.
+    """
+    problem_answers = {}
+    user_answers = UserAnswer.objects.filter(user=user, semester=semester).order_by('created_at')
+    for problem_id, is_solved in user_answers.values_list('problem_id', 'is_solved'):
+        problem_answers.setdefault(problem_id, []).append(is_solved)
+    return problem_answers
+
+
+def get_answer_access_error(problem: Problem, progresses: dict[UUID, Progress],
+                            answers: list[bool | None]) -> str | None:
+    """Проверяет, доступно ли задание для решения, по прогрессу пользователя
+    по темам семестра (ключ — id темы) и его ответам на задание.
+    Возвращает сообщение об ошибке или None, если задание доступно.
+    Аналог validate_answer_user_access без проверки записи на курс.
+    """
+    parent_topic_id = problem.main_topic.parent_topic_id
+    if parent_topic_id is not None and not progresses[parent_topic_id].is_theory_low_reached():
+        return f'Необходимо завершить тест по теории по теме {problem.main_topic.parent_topic}.'
+    progress = progresses[problem.main_topic_id]
+    if problem.type in PRACTICE_TYPES and not progress.is_theory_low_reached():
+        return 'Тест по теории не завершен.'
+    if problem.type in THEORY_TYPES and progress.is_theory_completed():
+        return 'Набран максимальный балл.'
+    if problem.type in PRACTICE_TYPES and progress.is_practice_completed():
+        return 'Набран максимальный балл.'
+    answers = [is_solved for is_solved in answers if is_solved is not None]
+    if problem.type in PRACTICE_TYPES:
+        if answers and answers[-1]:
+            return 'Вы уже отправили решение по этому заданию.'
+        if len(answers) >= Constants.MAX_NUMBER_OF_ATTEMPTS_PER_PRACTICE_PROBLEM:
+            return 'Вы истратили все попытки на решение этого задания.'
+    elif answers:
+        return 'Вы уже отправили решение по этому заданию.'
+    return None
+
+
+def is_problem_answered_in(problem: Problem, answers: list[bool | None]) -> bool:
+    """Возвращает True, если на задание дан ответ, по ответам пользователя
+    на задание. Аналог is_problem_answered.
+    """
+    if problem.type in PRACTICE_TYPES:
+        answers = [is_solved for is_solved in answers if is_solved is not None]
+        return len(answers) >= Constants.MAX_NUMBER_OF_ATTEMPTS_PER_PRACTICE_PROBLEM or any(answers)
+    return bool(answers)
@@ -8,7 +8,7 @@ from django.db.models import QuerySet, Model
 from django.http import HttpRequest, HttpResponse, JsonResponse
 
 from algorithm.utils import format_log_problem
-from answers.create_answer import create_user_answer
+from answers.create_answer import create_user_answer, create_user_answers
 from answers.utils import validate_answer_by_type, validate_answer_user_access
 from config.settings import SANDBOX_API_URL, SANDBOX_API_HEADER, SANDBOX_API_TOKEN
 from courses.models import Semester, Problem, PRACTICE_TYPES
@@ -50,6 +50,80 @@ def validate_answer(request: HttpRequest, semester_pk: UUID, problem_pk: UUID) -
     return JsonResponse(json_data, safe=False)
 
 
+def validate_answers(request: HttpRequest, semester_pk: UUID) -> HttpResponse:
+    """Проверка списка ответов пользователя (например, накопленных клиентом
+    без сети) с записью в БД и обновлением баллов. Ответы применяются
+    по порядку в одной транзакции, для каждого возвращается результат
+    в формате validate_answer или ошибка.
+    """
+    semester = Semester.objects.get(id=semester_pk)
+    if not semester.students.filter(pk=request.user.pk).exists():
+        return JsonResponse(json.dumps({'error': 'Вы не записаны на курс.'}), safe=False)
+    try:
+        items = list(json.loads(request.body)['answers'])
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f'( ! ) {request.user.username:<10} [ошибка во время проверки заданий] error {e}')
+        return JsonResponse(json.dumps({'error': str(e)}), safe=False)
+    problem_ids = [get_item_problem_id(item) for item in items]
+    problems = Problem.objects.select_related('main_topic__module', 'main_topic__parent_topic').in_bulk(
+        [problem_id for problem_id in problem_ids if problem_id is not None]
+    )
+    results = [None] * len(items)
+    answers = []
+    indices = []
+    for i, item in enumerate(items):
+        problem = problems.get(problem_ids[i])
+        if problem is None:
+            results[i] = {'error': 'Задание не найдено.'}
+            continue
+        if problem.main_topic.module.course_id != semester.course_id:
+            results[i] = {'error': 'Задание не относится к курсу.'}
+            continue
+        try:
+            if item['type'] != problem.type:
+                raise ValueError('Тип ответа не соответствует типу задания.')
+            coefficient, answer = validate_answer_by_type(item)
+        except KeyError as e:
+            results[i] = {'error': f'Не указано поле {e}.'}
+            continue
+        except (ValueError, NotImplementedError) as e:
+            logger.error(f'( ! ) {format_log_problem(request.user, problem)}'
+                         f' [ошибка во время проверки задания] '
+                         f'payload {item} error {e}')
+            results[i] = {'error': str(e)}
+            continue
+        answers.append((problem, coefficient, answer, item.get('time_elapsed_in_seconds')))
+        indices.append(i)
+    created_answers = create_user_answers(request.user, semester, answers)
+    for i, (problem, coefficient, answer, _), result in zip(indices, answers, created_answers):
+        if isinstance(result, str):
+            results[i] = {'error': result}
+            continue
+        _, is_answered = result
+        if type(answer) == QuerySet:
+            answer = [str(ans.id) for ans in answer]
+        if isinstance(answer, Model):
+            answer = str(answer.id)
+        results[i] = {
+            'coefficient': coefficient,
+            'is_answered': is_answered,
+            'answer': answer
+        }
+    json_data = json.dumps({'results': results})
+    logger.info(f'(   ) {request.user.username:<10}'
+                f' [проверка заданий] ({len(answers)}/{len(items)})'
+                f' response {json_data}')
+    return JsonResponse(json_data, safe=False)
+
+
+def get_item_problem_id(item: dict) -> UUID | None:
+    """Возвращает id задания из элемента списка ответов или None, если он не указан или некорректен."""
+    try:
+        return UUID(str(item['problem_id']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
 def run_stdin(request: HttpRequest, semester_pk: UUID, problem_pk: UUID) -> HttpResponse:
     """Отправляет запрос на сервер с песочницей, и проверяет код пользователя
     на введенных им входных данных."""
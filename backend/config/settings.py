@@ -62,6 +62,11 @@ class Constants:
     WEAKEST_LINK_MAX_PROBLEMS_PER_GROUP: int = 3
     WEAKEST_LINK_NUMBER_OF_PROBLEMS_TO_SOLVE: int = 2
     WEAKEST_LINK_PENALTY: float = 0.1
+    WEAKEST_LINK_EXACT_SPLIT_MAX_TOPICS: int = 18
+    WEAKEST_LINK_STATE_UPDATE_ATTEMPTS: int = 5
+    TOPIC_GRAPH_WEIGHT_PRIOR_ANSWERS: float = 5.0
+    TOPIC_GRAPH_LEARNING_CHUNK_SIZE: int = 10000
+    TOPIC_GRAPH_LEARNING_LAG_SECONDS: int = 300
 
     PROBLEM_SIMILARITY_PERCENT: float = 0.66
     MIN_CORRECT_ANSWER_COEFFICIENT: float = 0.66
@@ -71,6 +76,11 @@ class Constants:
 
     MAX_NUMBER_OF_ATTEMPTS_PER_PRACTICE_PROBLEM: int = 2
 
+    BACKGROUND_WORKERS: int = 2
+    COURSE_CACHE_MAX_SIZE: int = 32
+    COURSE_CACHE_TIMEOUT_SECONDS: int = 60 * 60
+    NEXT_PROBLEM_QUEUE_TIMEOUT_SECONDS: int = 60 * 60
+
 
 # Application definition
 
@@ -133,6 +143,22 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Очередь заранее подобранных заданий общая для всех процессов и хранится в БД.
+# Таблица кэша создается при развертывании: python manage.py createcachetable
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'next_problem': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'next_problem_cache',
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 